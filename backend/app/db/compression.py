@@ -0,0 +1,89 @@
+"""
+Binary encoding of room code for the compressed storage mode.
+
+Layout: 1 byte format version, 1 byte codec, then the payload.
+"""
+
+import logging
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+CODECS = {"raw": CODEC_RAW, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+
+def encode_code(code: str, codec: str = "zlib", level: int = 6) -> bytes:
+    """
+    Encode code for the binary column.
+    
+    Falls back to zlib if zstd is requested but `zstandard` is not installed,
+    and to raw UTF-8 if compression does not make the payload smaller.
+    
+    Args:
+        code: The code to encode
+        codec: "raw", "zlib" or "zstd"
+        level: Compression level
+    
+    Returns:
+        bytes: Versioned, compressed payload
+    """
+    raw = code.encode("utf-8")
+    codec_id = CODECS[codec]
+    
+    if codec_id == CODEC_ZSTD and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to zlib")
+        codec_id = CODEC_ZLIB
+    
+    if codec_id == CODEC_ZSTD:
+        payload = zstandard.ZstdCompressor(level=level).compress(raw)
+    elif codec_id == CODEC_ZLIB:
+        payload = zlib.compress(raw, level)
+    else:
+        payload = raw
+    
+    if len(payload) >= len(raw):
+        codec_id, payload = CODEC_RAW, raw
+    
+    return bytes((FORMAT_VERSION, codec_id)) + payload
+
+
+def decode_code(data: bytes) -> str:
+    """
+    Decode a payload produced by encode_code.
+    
+    Args:
+        data: Versioned payload from the binary column
+    
+    Returns:
+        str: The code
+    
+    Raises:
+        ValueError: If the format version or codec is unknown
+    """
+    version, codec_id, payload = data[0], data[1], data[2:]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unknown code storage format version {version}")
+    
+    if codec_id == CODEC_RAW:
+        raw = payload
+    elif codec_id == CODEC_ZLIB:
+        raw = zlib.decompress(payload)
+    elif codec_id == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstandard is required to read zstd-compressed code")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        raise ValueError(f"Unknown code storage codec {codec_id}")
+    
+    return bytes(raw).decode("utf-8")
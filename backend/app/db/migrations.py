@@ -0,0 +1,48 @@
+"""
+Schema upgrades that Base.metadata.create_all does not perform on existing tables.
+Run at application startup and by init_db.py.
+"""
+
+from typing import List
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import LargeBinary
+
+logger = logging.getLogger(__name__)
+
+# Columns added after their table was first created: table -> column -> type
+ADDED_COLUMNS = {
+    "rooms": {"code_compressed": LargeBinary()},
+    "archived_rooms": {"code_compressed": LargeBinary()},
+}
+
+
+def add_missing_columns(engine: Engine) -> List[str]:
+    """
+    Add nullable columns missing from tables created by an older version.
+    
+    Args:
+        engine: The database engine
+    
+    Returns:
+        List[str]: The added columns, as "table.column"
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if table not in tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, column_type in columns.items():
+                if name not in existing:
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ADD COLUMN {name} {column_type.compile(dialect=engine.dialect)}"
+                    ))
+                    added.append(f"{table}.{name}")
+    for column in added:
+        logger.info(f"Added missing column {column}")
+    return added
@@ -1,17 +1,28 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
 import json
 import logging
 
 from app.config import settings
-from app.db import engine, Base, get_db
+from app.db import engine, Base, SessionLocal, get_db
+from app.db.migrations import add_missing_columns
 from app.routers import rooms, autocomplete
 from app.websockets.connection_manager import manager
+from app.websockets.room_actor import MAIN_FILE
+from app.websockets.rate_limiter import rate_limiter
+from app.websockets.sync import (
+    SYNC_FULL, SYNC_LAZY, SYNC_MODES, stream_sync, send_chunks,
+    line_range_to_offsets, parse_line_range
+)
 from app.services.room_service import RoomService
+from app.services.room_reaper import RoomReaper
 
-# Initialize database tables
+# Initialize database tables, and add columns introduced since they were created
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +35,15 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Background reaper for idle rooms
+room_reaper = RoomReaper(
+    idle_ttl=settings.room_idle_ttl,
+    interval=settings.room_gc_interval,
+    batch_size=settings.room_gc_batch_size,
+    archive=settings.room_gc_mode == "archive",
+    active_rooms=lambda: [*manager.active_connections, *manager.spectators]
+)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -44,18 +64,84 @@ async def health_check() -> dict:
     return {"status": "healthy", "service": settings.app_name}
 
 
+@app.get("/metrics")
+async def metrics() -> dict:
+    """Runtime counters for throttling and room garbage collection."""
+    return {
+        "rate_limiter": rate_limiter.get_stats(),
+        "rooms_reaped": room_reaper.reaped_total,
+        "room_actors": manager.get_actor_stats(),
+        "spectators": sum(len(spectators) for spectators in manager.spectators.values()),
+        "spectator_frames": manager.get_spectator_frames()
+    }
+
+
 @app.websocket("/ws/{room_id}")
 async def websocket_endpoint(room_id: str, websocket: WebSocket, db: Session = Depends(get_db)):
     """
     WebSocket endpoint for real-time code synchronization.
     
+    Query parameters:
+        sync: "full" (default) sends the document in one `sync` frame,
+            "stream" sends it in `sync_chunk` frames, "lazy" sends only the
+            visible range and lets the client `fetch_range` the rest
+        visible: Optional "start-end" line range to send first
+        protocol: "patch" to receive `code_patch` diffs instead of full
+            `code_update` frames
+        role: "spectator" to join read-only, with throttled batched updates
+            and `presence` counts instead of user lists
+    
+    Connections receive the room's main document by default and can
+    `subscribe` to additional files; updates and cursors carrying a `file`
+    are only sent to that file's subscribers.
+    
     Args:
         room_id: The room identifier
         websocket: The WebSocket connection
         db: Database session
     """
     # Connect the user and get assigned user_id and color
-    user_id, color = await manager.connect(room_id, websocket)
+    spectator = websocket.query_params.get("role") == "spectator"
+    if spectator:
+        user_id, color = await manager.connect_spectator(room_id, websocket), None
+    else:
+        accepts_patches = websocket.query_params.get("protocol") == "patch"
+        user_id, color = await manager.connect(room_id, websocket, accepts_patches=accepts_patches)
+    
+    # Set once active_users has been incremented for this connection
+    joined = False
+    
+    async def leave() -> None:
+        # Shared by clean disconnects and errors, so no exit path leaks
+        # active_users, rate limit buckets or the user_left notification
+        await manager.disconnect(room_id, user_id)
+        rate_limiter.forget_connection(room_id, user_id)
+        
+        if spectator:
+            if not manager.get_active_users_count(room_id) and not manager.get_spectator_count(room_id):
+                rate_limiter.forget_room(room_id)
+            logger.info(f"Spectator disconnected from room {room_id}")
+            return
+        
+        # Decrement active users
+        if joined:
+            room_service = RoomService(db)
+            room_service.decrement_active_users(room_id)
+        
+        # Notify remaining users
+        active_count = manager.get_active_users_count(room_id)
+        if active_count > 0:
+            await manager.broadcast(room_id, {
+                "type": "user_left",
+                "active_users": active_count,
+                "user_id": user_id,
+                "users": manager.get_all_users(room_id)
+            })
+        else:
+            rate_limiter.forget_room(room_id)
+            logger.info(f"Room {room_id} is now empty")
+        
+        logger.info(f"User disconnected from room {room_id}")
     
     try:
         # Verify room exists
@@ -70,87 +156,246 @@ async def websocket_endpoint(room_id: str, websocket: WebSocket, db: Session = D
             await manager.disconnect(room_id, user_id)
             return
         
-        # Increment active users
-        room_service.increment_active_users(room_id)
+        def current_document() -> Tuple[str, Optional[int]]:
+            # The room actor owns the live document and its revision while editors are connected
+            actor = manager.room_actors.get(room_id)
+            if actor is not None:
+                return actor.code, actor.revision()
+            db.refresh(room)
+            return room.code, None
+        
+        if spectator:
+            sync_header = {
+                "type": "sync",
+                "role": "spectator",
+                "active_users": manager.get_active_users_count(room_id),
+                "spectators": manager.get_spectator_count(room_id),
+                "user_id": user_id
+            }
+        else:
+            # Increment active users
+            room_service.increment_active_users(room_id)
+            joined = True
+            actor = await manager.get_actor(room_id, room.code)
+            sync_header = {
+                "type": "sync",
+                "active_users": manager.get_active_users_count(room_id),
+                "spectators": manager.get_spectator_count(room_id),
+                "user_id": user_id,
+                "color": color,
+                "users": manager.get_all_users(room_id)
+            }
+        
+        # Take the snapshot and subscribe in one step, so the first code_update or
+        # code_patch this user receives applies on top of the snapshot's revision
+        code, revision = current_document()
+        sync_header["rev"] = revision
+        if not spectator:
+            manager.subscribe(room_id, user_id, MAIN_FILE)
         
         # Send initial code state to the new user with user info
-        await websocket.send_json({
-            "type": "sync",
-            "code": room.code,
-            "active_users": manager.get_active_users_count(room_id),
-            "user_id": user_id,
-            "color": color,
-            "users": manager.get_all_users(room_id)
-        })
+        sync_mode = websocket.query_params.get("sync", SYNC_FULL)
+        if sync_mode not in SYNC_MODES:
+            sync_mode = SYNC_FULL
+        if sync_mode == SYNC_FULL:
+            await websocket.send_json({**sync_header, "code": code})
+        else:
+            await stream_sync(
+                websocket,
+                code,
+                sync_header,
+                settings.ws_sync_chunk_size,
+                visible=parse_line_range(websocket.query_params.get("visible")),
+                lazy=sync_mode == SYNC_LAZY
+            )
+        
+        # Notify others that a user joined with their color (spectators only show up in presence counts)
+        if not spectator:
+            await manager.broadcast(room_id, {
+                "type": "user_joined",
+                "active_users": manager.get_active_users_count(room_id),
+                "user_id": user_id,
+                "color": color,
+                "users": manager.get_all_users(room_id)
+            })
         
-        # Notify others that a user joined with their color
-        await manager.broadcast(room_id, {
-            "type": "user_joined",
-            "active_users": manager.get_active_users_count(room_id),
-            "user_id": user_id,
-            "color": color,
-            "users": manager.get_all_users(room_id)
-        })
+        logger.info(f"{'Spectator' if spectator else 'User'} joined room {room_id}")
         
-        logger.info(f"User joined room {room_id}")
+        # Only tell the client once per run of throttled messages
+        throttle_notified = False
         
         # Listen for messages
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
+            
+            # Reject oversized frames before paying for JSON parsing
+            frame_size = len(data.encode("utf-8"))
+            if frame_size > settings.ws_max_frame_bytes:
+                rate_limiter.record_oversized_frame(room_id, frame_size)
+                await websocket.send_json({
+                    "type": "error",
+                    "message": f"Message too large (max {settings.ws_max_frame_bytes} bytes)"
+                })
+                continue
+            
+            try:
+                message = json.loads(data)
+            except json.JSONDecodeError:
+                await websocket.send_json({
+                    "type": "error",
+                    "message": "Invalid JSON"
+                })
+                continue
+            
+            if not isinstance(message, dict):
+                continue
             
             action = message.get("action")
             
+            # Rejected before rate limiting, so spectators never spend the editors' room budget
+            if spectator and action in ("update", "cursor_position", "subscribe", "unsubscribe"):
+                await websocket.send_json({
+                    "type": "error",
+                    "message": "Spectators cannot edit or open files"
+                })
+                continue
+            
+            if not rate_limiter.allow(room_id, user_id, str(action)):
+                if not throttle_notified:
+                    throttle_notified = True
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": "Rate limit exceeded, messages are being dropped"
+                    })
+                continue
+            throttle_notified = False
+            
+            # Edits and cursors apply to the room's main document unless a file is given
+            file = message.get("file")
+            if file is not None and not isinstance(file, str):
+                await websocket.send_json({
+                    "type": "error",
+                    "message": "file must be a string"
+                })
+                continue
+            if file is not None and action in ("update", "cursor_position", "fetch_range"):
+                if not manager.is_subscribed(room_id, user_id, file):
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": f"Not subscribed to {file}"
+                    })
+                    continue
+            
             if action == "update":
-                # Update code in database and broadcast to others
+                # Hand the update to the room actor, which persists and broadcasts once per tick
                 new_code = message.get("code", "")
-                room_service.update_code(room_id, new_code)
+                if not isinstance(new_code, str):
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": "code must be a string"
+                    })
+                    continue
+                document_size = len(new_code.encode("utf-8"))
+                if document_size > settings.ws_max_document_bytes:
+                    rate_limiter.record_oversized_document(room_id, document_size)
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": f"Document too large (max {settings.ws_max_document_bytes} bytes)"
+                    })
+                    continue
                 
-                # Broadcast the update to all clients in the room
-                await manager.broadcast(room_id, {
-                    "type": "code_update",
-                    "code": new_code,
+                actor.post({
+                    "action": "update",
                     "user_id": user_id,
-                    "color": color
+                    "color": color,
+                    "file": file,
+                    "code": new_code
                 })
             
             elif action == "cursor_position":
-                # Broadcast cursor position with user color
-                await manager.broadcast(room_id, {
-                    "type": "cursor_update",
+                # Only the latest cursor of each user per tick is broadcast
+                actor.post({
+                    "action": "cursor_position",
                     "user_id": user_id,
                     "color": color,
+                    "file": file,
                     "position": message.get("position"),
                     "line": message.get("line")
                 })
             
+            elif action == "fetch_range":
+                # Lazily send a line range of the current document
+                try:
+                    start_line = int(message.get("start_line", 1))
+                    end_line = int(message.get("end_line", start_line))
+                except (TypeError, ValueError):
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": "Invalid line range"
+                    })
+                    continue
+                
+                # Offsets are relative to this revision; a client holding another one must resync
+                if file is None:
+                    code, revision = current_document()
+                else:
+                    code, revision = actor.documents.get(file, ""), actor.revision(file)
+                start, end = line_range_to_offsets(code, start_line, end_line)
+                chunks = await send_chunks(websocket, code, settings.ws_sync_chunk_size, start, end)
+                await websocket.send_json({
+                    "type": "range_complete",
+                    "rev": revision,
+                    "start": start,
+                    "end": end,
+                    "length": len(code),
+                    "chunks": chunks
+                })
+            
+            elif action == "subscribe":
+                # Open a file: loaded from the database on first subscribe, then synced to this user
+                if not isinstance(file, str):
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": "subscribe requires a file"
+                    })
+                    continue
+                
+                code = await actor.open_file(file, user_id)
+                if code is None:
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": f"File not found: {file}"
+                    })
+                    continue
+                
+                await websocket.send_json({
+                    "type": "file_sync",
+                    "file": file,
+                    "code": code,
+                    "rev": actor.revision(file)
+                })
+            
+            elif action == "unsubscribe":
+                manager.unsubscribe(room_id, user_id, file)
+            
             else:
                 logger.warning(f"Unknown action: {action}")
     
     except WebSocketDisconnect:
-        await manager.disconnect(room_id, user_id)
-        
-        # Decrement active users
-        room_service = RoomService(db)
-        room_service.decrement_active_users(room_id)
-        
-        # Notify remaining users
-        active_count = manager.get_active_users_count(room_id)
-        if active_count > 0:
-            await manager.broadcast(room_id, {
-                "type": "user_left",
-                "active_users": active_count,
-                "user_id": user_id,
-                "users": manager.get_all_users(room_id)
-            })
-        else:
-            logger.info(f"Room {room_id} is now empty")
-        
-        logger.info(f"User disconnected from room {room_id}")
+        await leave()
     
     except Exception as e:
         logger.error(f"WebSocket error in room {room_id}: {e}")
-        await manager.disconnect(room_id, websocket)
+        try:
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+        try:
+            # The session may be unusable after a database error
+            db.rollback()
+            await leave()
+        except Exception as cleanup_error:
+            logger.error(f"Failed to clean up connection {user_id} in room {room_id}: {cleanup_error}")
 
 
 @app.on_event("startup")
@@ -158,9 +403,24 @@ async def startup_event():
     """Startup event."""
     logger.info(f"Starting {settings.app_name}")
     logger.info(f"Database URL: {settings.database_url[:30]}...")
+    
+    # Counts left behind by a process that exited without its disconnect handlers;
+    # rooms used within the idle TTL may have connections on other workers
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.room_idle_ttl)
+        reset = RoomService(db).reset_active_users(cutoff)
+        if reset:
+            logger.info(f"Reset active_users of {reset} rooms idle since before {cutoff}")
+    finally:
+        db.close()
+    
+    if settings.room_gc_enabled:
+        room_reaper.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown event."""
+    await room_reaper.stop()
     logger.info(f"Shutting down {settings.app_name}")
@@ -1,3 +1,4 @@
-from app.models.room import Room
+from app.models.room import Room, ArchivedRoom
+from app.models.room_file import RoomFile
 
-__all__ = ["Room"]
+__all__ = ["Room", "ArchivedRoom", "RoomFile"]
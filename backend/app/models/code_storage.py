@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Text, LargeBinary
+from sqlalchemy.ext.hybrid import hybrid_property
+from app.config import settings
+from app.db.compression import encode_code, decode_code
+from typing import Optional, Tuple
+
+
+class CodeStorageMixin:
+    """Code columns shared by rooms and room files, with optional compression."""
+    
+    # Plain storage; left empty when the code is stored in code_compressed
+    code_text = Column("code", Text, default="", nullable=False)
+    # Compressed storage (see app.db.compression), NULL in plain mode
+    code_compressed = Column(LargeBinary, nullable=True)
+    
+    @hybrid_property
+    def code(self) -> str:
+        """The code, decompressed if stored compressed."""
+        if self.code_compressed is not None:
+            return decode_code(self.code_compressed)
+        return self.code_text
+    
+    @code.setter
+    def code(self, value: str) -> None:
+        """Store the code using the configured storage mode."""
+        self.code_text, self.code_compressed = self.encode_storage(value)
+    
+    @code.expression
+    def code(cls):
+        # Only meaningful for rows in plain storage
+        return cls.code_text
+    
+    @staticmethod
+    def encode_storage(code: str) -> Tuple[str, Optional[bytes]]:
+        """
+        Encode code for the configured storage mode.
+        
+        Args:
+            code: The code to store
+        
+        Returns:
+            Tuple[str, Optional[bytes]]: Values for (code_text, code_compressed)
+        """
+        if settings.code_storage == "text":
+            return code, None
+        return "", encode_code(code, settings.code_storage, settings.code_compression_level)
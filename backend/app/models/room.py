@@ -1,19 +1,43 @@
-from sqlalchemy import Column, String, Text, DateTime, Integer
-from sqlalchemy.sql import func
+from sqlalchemy import Column, String, Text, DateTime, Integer, Index, LargeBinary
 from app.db.base import Base
+from app.models.code_storage import CodeStorageMixin
 from datetime import datetime
 
 
-class Room(Base):
+class Room(CodeStorageMixin, Base):
     """Model for storing room code and metadata."""
     
     __tablename__ = "rooms"
     
     room_id = Column(String(36), primary_key=True, index=True)
-    code = Column(Text, default="", nullable=False)
-    created_at = Column(DateTime, default=func.now(), nullable=False)
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+    # Python-side UTC timestamps, matching RoomService.update_code and the idle reaper cutoff
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     active_users = Column(Integer, default=0, nullable=False)
     
+    __table_args__ = (
+        # Idle room garbage collection: active_users = 0 AND updated_at < cutoff
+        Index("ix_rooms_active_users_updated_at", "active_users", "updated_at"),
+        # Keyset pagination ordered by (updated_at, room_id)
+        Index("ix_rooms_updated_at_room_id", "updated_at", "room_id"),
+    )
+    
     def __repr__(self) -> str:
         return f"<Room(room_id={self.room_id}, active_users={self.active_users})>"
+
+
+class ArchivedRoom(Base):
+    """Model for rooms archived by the idle room reaper."""
+    
+    __tablename__ = "archived_rooms"
+    
+    room_id = Column(String(36), primary_key=True, index=True)
+    code = Column(Text, default="", nullable=False)
+    # Copied as-is from rooms.code_compressed
+    code_compressed = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self) -> str:
+        return f"<ArchivedRoom(room_id={self.room_id}, archived_at={self.archived_at})>"
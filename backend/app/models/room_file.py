@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime
+from app.db.base import Base
+from app.models.code_storage import CodeStorageMixin
+from datetime import datetime
+
+
+class RoomFile(CodeStorageMixin, Base):
+    """Model for additional files of a multi-document room."""
+    
+    __tablename__ = "room_files"
+    
+    # No foreign key: files of archived rooms are kept under the same room_id
+    room_id = Column(String(36), primary_key=True)
+    path = Column(String(255), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def __repr__(self) -> str:
+        return f"<RoomFile(room_id={self.room_id}, path={self.path})>"
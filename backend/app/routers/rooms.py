@@ -1,13 +1,112 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
 from sqlalchemy.orm import Session
 from uuid import uuid4
-from app.schemas.room import RoomCreate, RoomResponse
+from datetime import datetime
+from typing import List, Optional, Tuple
+import base64
+import secrets
+from app.config import settings
+from app.schemas.room import (
+    RoomCreate, RoomResponse, RoomListResponse,
+    RoomFileCreate, RoomFileSummary, RoomFileResponse, SearchResponse
+)
 from app.services.room_service import RoomService
+from app.services.search_service import SearchService
 from app.db import get_db
+from app.websockets.connection_manager import manager
 
 router = APIRouter(prefix="/rooms", tags=["rooms"])
 
 
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Dependency guarding admin endpoints, which stay closed until an admin token is configured."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def encode_cursor(updated_at: datetime, room_id: str) -> str:
+    """Encode the keyset position of a room as an opaque cursor."""
+    raw = f"{updated_at.isoformat()}|{room_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, room_id = raw.split("|", 1)
+        return datetime.fromisoformat(updated_at), room_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("", response_model=RoomListResponse, dependencies=[Depends(require_admin)])
+async def list_rooms(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+) -> RoomListResponse:
+    """
+    List rooms ordered by last update, oldest first.
+    
+    Uses keyset pagination: pass the returned next_cursor to get the next
+    page. Each page is a single index range scan, regardless of depth.
+    
+    Args:
+        limit: Maximum number of rooms per page
+        cursor: Cursor returned by the previous page
+        
+    Returns:
+        RoomListResponse: Rooms and the cursor to the next page
+    """
+    room_service = RoomService(db)
+    after = decode_cursor(cursor) if cursor else None
+    rooms = room_service.list_rooms(limit, after)
+    
+    next_cursor = None
+    if len(rooms) == limit:
+        last = rooms[-1]
+        next_cursor = encode_cursor(last.updated_at, last.room_id)
+    
+    return RoomListResponse(rooms=rooms, next_cursor=next_cursor)
+
+
+@router.get("/search", response_model=SearchResponse, dependencies=[Depends(require_admin)])
+def search_rooms(
+    q: str = Query(..., min_length=3, max_length=256),
+    limit: int = Query(20, ge=1),
+    db: Session = Depends(get_db)
+) -> SearchResponse:
+    """
+    Search the code of all rooms and their files.
+    
+    Matching is case-insensitive substring search, backed by a trigram
+    index (pg_trgm on PostgreSQL, an in-process index otherwise), so it
+    does not scan every room. A plain function, so it runs in the
+    threadpool: the first in-process search builds the index.
+    
+    Args:
+        q: The text to find, at least 3 characters
+        limit: Maximum number of matching documents
+        
+    Returns:
+        SearchResponse: Matching rooms and files with line snippets
+        
+    Raises:
+        HTTPException: If no search backend is available
+    """
+    search_service = SearchService(db)
+    results = search_service.search(q, min(limit, settings.search_max_results))
+    if results is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Room search needs pg_trgm and CODE_STORAGE=text on PostgreSQL, or SEARCH_BACKEND=memory"
+        )
+    return SearchResponse(query=q, backend=search_service.backend(), results=results)
+
+
 @router.post("", response_model=RoomResponse, status_code=201)
 async def create_room(
     room_create: RoomCreate,
@@ -64,3 +163,100 @@ async def delete_room(
     """
     room_service = RoomService(db)
     room_service.delete_room(room_id)
+
+
+@router.get("/{room_id}/files", response_model=List[RoomFileSummary])
+async def list_files(
+    room_id: str,
+    db: Session = Depends(get_db)
+) -> List[RoomFileSummary]:
+    """
+    List the additional files of a room.
+    
+    Args:
+        room_id: The room identifier
+        
+    Returns:
+        List[RoomFileSummary]: Files ordered by path, without their code
+    """
+    room_service = RoomService(db)
+    return room_service.list_files(room_id)
+
+
+@router.post("/{room_id}/files", response_model=RoomFileResponse, status_code=201)
+async def create_file(
+    room_id: str,
+    file_create: RoomFileCreate,
+    db: Session = Depends(get_db)
+) -> RoomFileResponse:
+    """
+    Create an empty file in a room.
+    
+    Args:
+        room_id: The room identifier
+        
+    Returns:
+        RoomFileResponse: The created file
+        
+    Raises:
+        HTTPException: If room not found or the path already exists
+    """
+    room_service = RoomService(db)
+    if not room_service.get_room(room_id):
+        raise HTTPException(status_code=404, detail="Room not found")
+    
+    room_file = room_service.create_file(room_id, file_create.path)
+    if not room_file:
+        raise HTTPException(status_code=409, detail="File already exists")
+    
+    return room_file
+
+
+@router.get("/{room_id}/files/{path:path}", response_model=RoomFileResponse)
+async def get_file(
+    room_id: str,
+    path: str,
+    db: Session = Depends(get_db)
+) -> RoomFileResponse:
+    """
+    Get a file of a room.
+    
+    Args:
+        room_id: The room identifier
+        path: The file path within the room
+        
+    Returns:
+        RoomFileResponse: File details and code
+        
+    Raises:
+        HTTPException: If file not found
+    """
+    room_service = RoomService(db)
+    room_file = room_service.get_file(room_id, path)
+    
+    if not room_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    return room_file
+
+
+@router.delete("/{room_id}/files/{path:path}", status_code=204)
+async def delete_file(
+    room_id: str,
+    path: str,
+    db: Session = Depends(get_db)
+) -> None:
+    """
+    Delete a file of a room.
+    
+    Args:
+        room_id: The room identifier
+        path: The file path within the room
+    """
+    room_service = RoomService(db)
+    room_service.delete_file(room_id, path)
+    
+    # Close the file for editors who have it open on this worker
+    actor = manager.room_actors.get(room_id)
+    if actor is not None:
+        actor.close_file(path)
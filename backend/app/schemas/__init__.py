@@ -1,3 +1,13 @@
-from app.schemas.room import RoomCreate, RoomResponse, CodeUpdate, AutocompleteRequest, AutocompleteResponse
+from app.schemas.room import (
+    RoomCreate, RoomResponse, RoomSummary, RoomListResponse,
+    RoomFileCreate, RoomFileSummary, RoomFileResponse,
+    SearchSnippet, SearchResult, SearchResponse, CodeUpdate,
+    AutocompleteRequest, AutocompleteResponse
+)
 
-__all__ = ["RoomCreate", "RoomResponse", "CodeUpdate", "AutocompleteRequest", "AutocompleteResponse"]
+__all__ = [
+    "RoomCreate", "RoomResponse", "RoomSummary", "RoomListResponse",
+    "RoomFileCreate", "RoomFileSummary", "RoomFileResponse",
+    "SearchSnippet", "SearchResult", "SearchResponse", "CodeUpdate",
+    "AutocompleteRequest", "AutocompleteResponse"
+]
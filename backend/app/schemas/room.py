@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List, Optional
 
@@ -20,6 +20,64 @@ class RoomResponse(BaseModel):
         from_attributes = True
 
 
+class RoomSummary(BaseModel):
+    """Schema for a room in admin listings (without its code)."""
+    room_id: str
+    created_at: datetime
+    updated_at: datetime
+    active_users: int
+    
+    class Config:
+        from_attributes = True
+
+
+class RoomListResponse(BaseModel):
+    """Schema for a page of rooms with the cursor to the next page."""
+    rooms: List[RoomSummary]
+    next_cursor: Optional[str] = None
+
+
+class RoomFileCreate(BaseModel):
+    """Schema for creating a file in a room."""
+    path: str = Field(min_length=1, max_length=255)
+
+
+class RoomFileSummary(BaseModel):
+    """Schema for a file in file listings (without its code)."""
+    room_id: str
+    path: str
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class RoomFileResponse(RoomFileSummary):
+    """Schema for file response."""
+    code: str
+
+
+class SearchSnippet(BaseModel):
+    """Schema for a matching line of a search result."""
+    line: int  # 1-based
+    text: str
+
+
+class SearchResult(BaseModel):
+    """Schema for a room document matching a search."""
+    room_id: str
+    path: Optional[str] = None  # None for the room's main document
+    snippets: List[SearchSnippet]
+
+
+class SearchResponse(BaseModel):
+    """Schema for room search results."""
+    query: str
+    backend: str  # "postgres" or "memory"
+    results: List[SearchResult]
+
+
 class CodeUpdate(BaseModel):
     """Schema for code update via WebSocket."""
     action: str  # "update", "join", "leave"
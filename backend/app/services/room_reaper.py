@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+import asyncio
+import logging
+
+from app.db import SessionLocal
+from app.services.room_service import RoomService
+
+logger = logging.getLogger(__name__)
+
+
+class RoomReaper:
+    """Background task that removes rooms idle for longer than the configured TTL."""
+    
+    def __init__(
+        self,
+        idle_ttl: int,
+        interval: int,
+        batch_size: int,
+        archive: bool = False,
+        active_rooms: Callable[[], Iterable[str]] = lambda: ()
+    ):
+        self.idle_ttl = idle_ttl
+        self.interval = interval
+        self.batch_size = batch_size
+        self.archive = archive
+        # Rooms with live sockets on this process are never reaped
+        self.active_rooms = active_rooms
+        self.reaped_total = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    def run_once(self, exclude: Optional[Iterable[str]] = None) -> int:
+        """
+        Reap all currently idle rooms, one indexed batch per transaction.
+        
+        Args:
+            exclude: Room IDs to keep, defaults to the rooms with live sockets
+        
+        Returns:
+            int: Number of rooms removed
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.idle_ttl)
+        exclude = list(self.active_rooms() if exclude is None else exclude)
+        removed = 0
+        
+        db = SessionLocal()
+        try:
+            room_service = RoomService(db)
+            while True:
+                count = room_service.purge_idle_rooms(
+                    cutoff, self.batch_size, archive=self.archive, exclude=exclude
+                )
+                removed += count
+                if count < self.batch_size:
+                    break
+        finally:
+            db.close()
+        
+        self.reaped_total += removed
+        if removed:
+            action = "Archived" if self.archive else "Deleted"
+            logger.info(f"{action} {removed} idle rooms (idle since before {cutoff})")
+        return removed
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Snapshot live rooms on the event loop, then do the DB work off it
+                exclude = list(self.active_rooms())
+                await asyncio.to_thread(self.run_once, exclude)
+            except Exception as e:
+                logger.error(f"Idle room reaper failed: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def start(self) -> None:
+        """Start the background reaper task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Cancel the background reaper task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,6 +1,11 @@
+from sqlalchemy import case, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.models.room import Room
+from app.models.room import Room, ArchivedRoom
+from app.models.room_file import RoomFile
+from app.services.search_index import search_index
 from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 
 class RoomService:
@@ -54,6 +59,7 @@ class RoomService:
             room.updated_at = datetime.utcnow()
             self.db.commit()
             self.db.refresh(room)
+            search_index.update(room_id, None, code)
         return room
     
     def increment_active_users(self, room_id: str) -> Room | None:
@@ -66,12 +72,13 @@ class RoomService:
         Returns:
             Room or None: The updated room or None if not found
         """
-        room = self.get_room(room_id)
-        if room:
-            room.active_users = max(0, room.active_users + 1)
-            self.db.commit()
-            self.db.refresh(room)
-        return room
+        # Atomic in SQL: connections each have their own session, and a
+        # read-modify-write through a stale session would lose updates
+        self.db.execute(
+            update(Room).where(Room.room_id == room_id).values(active_users=Room.active_users + 1)
+        )
+        self.db.commit()
+        return self.get_room(room_id)
     
     def decrement_active_users(self, room_id: str) -> Room | None:
         """
@@ -83,12 +90,14 @@ class RoomService:
         Returns:
             Room or None: The updated room or None if not found
         """
-        room = self.get_room(room_id)
-        if room:
-            room.active_users = max(0, room.active_users - 1)
-            self.db.commit()
-            self.db.refresh(room)
-        return room
+        # Atomic in SQL, like increment_active_users
+        self.db.execute(
+            update(Room).where(Room.room_id == room_id).values(
+                active_users=case((Room.active_users > 0, Room.active_users - 1), else_=0)
+            )
+        )
+        self.db.commit()
+        return self.get_room(room_id)
     
     def delete_room(self, room_id: str) -> bool:
         """
@@ -102,7 +111,274 @@ class RoomService:
         """
         room = self.get_room(room_id)
         if room:
+            self.db.query(RoomFile).filter(RoomFile.room_id == room_id).delete(
+                synchronize_session=False
+            )
             self.db.delete(room)
             self.db.commit()
+            search_index.remove_room(room_id)
             return True
         return False
+    
+    def list_files(self, room_id: str) -> List[RoomFile]:
+        """
+        List the additional files of a room.
+        
+        Args:
+            room_id: The room identifier
+            
+        Returns:
+            List[RoomFile]: Files ordered by path
+        """
+        return (
+            self.db.query(RoomFile)
+            .filter(RoomFile.room_id == room_id)
+            .order_by(RoomFile.path)
+            .all()
+        )
+    
+    def get_file(self, room_id: str, path: str) -> RoomFile | None:
+        """
+        Get a file of a room.
+        
+        Args:
+            room_id: The room identifier
+            path: The file path within the room
+            
+        Returns:
+            RoomFile or None: The file or None if not found
+        """
+        return self.db.get(RoomFile, (room_id, path))
+    
+    def create_file(self, room_id: str, path: str) -> RoomFile | None:
+        """
+        Create an empty file in a room.
+        
+        Args:
+            room_id: The room identifier
+            path: The file path within the room
+            
+        Returns:
+            RoomFile or None: The created file or None if the path already exists
+        """
+        room_file = RoomFile(room_id=room_id, path=path, code="")
+        self.db.add(room_file)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            return None
+        self.db.refresh(room_file)
+        return room_file
+    
+    def update_file_code(self, room_id: str, path: str, code: str) -> RoomFile | None:
+        """
+        Update the code of a file, and the room's updated_at so it is not reaped as idle.
+        
+        Args:
+            room_id: The room identifier
+            path: The file path within the room
+            code: The new code content
+            
+        Returns:
+            RoomFile or None: The updated file or None if not found
+        """
+        room_file = self.get_file(room_id, path)
+        if room_file:
+            now = datetime.utcnow()
+            room_file.code = code
+            room_file.updated_at = now
+            self.db.execute(update(Room).where(Room.room_id == room_id).values(updated_at=now))
+            self.db.commit()
+            self.db.refresh(room_file)
+            search_index.update(room_id, path, code)
+        return room_file
+    
+    def delete_file(self, room_id: str, path: str) -> bool:
+        """
+        Delete a file of a room.
+        
+        Args:
+            room_id: The room identifier
+            path: The file path within the room
+            
+        Returns:
+            bool: True if deleted, False if not found
+        """
+        room_file = self.get_file(room_id, path)
+        if room_file:
+            self.db.delete(room_file)
+            self.db.commit()
+            search_index.remove(room_id, path)
+            return True
+        return False
+    
+    def reset_active_users(self, cutoff: datetime) -> int:
+        """
+        Zero the active_users count of rooms idle since before a cutoff, keeping updated_at.
+        
+        Rooms used more recently may have live connections on other workers,
+        so their counts are left alone.
+        
+        Args:
+            cutoff: Only rooms last updated before this time are reset
+            
+        Returns:
+            int: Number of rooms reset
+        """
+        query = update(Room).where(Room.active_users != 0, Room.updated_at < cutoff)
+        result = self.db.execute(query.values(active_users=0, updated_at=Room.updated_at))
+        self.db.commit()
+        return result.rowcount
+    
+    def list_rooms(
+        self,
+        limit: int,
+        after: Optional[Tuple[datetime, str]] = None
+    ) -> List[Room]:
+        """
+        List rooms ordered by (updated_at, room_id) using keyset pagination.
+        
+        Args:
+            limit: Maximum number of rooms to return
+            after: (updated_at, room_id) of the last room of the previous page
+            
+        Returns:
+            List[Room]: The next page of rooms
+        """
+        query = self.db.query(Room)
+        if after is not None:
+            query = query.filter(tuple_(Room.updated_at, Room.room_id) > tuple_(*after))
+        return query.order_by(Room.updated_at, Room.room_id).limit(limit).all()
+    
+    def purge_idle_rooms(
+        self,
+        cutoff: datetime,
+        batch_size: int,
+        archive: bool = False,
+        exclude: Iterable[str] = ()
+    ) -> int:
+        """
+        Delete (or archive) one batch of rooms with no users and no edits since cutoff.
+        
+        Args:
+            cutoff: Rooms last updated before this time are considered idle
+            batch_size: Maximum number of rooms to remove
+            archive: Copy the rooms to archived_rooms before deleting them
+            exclude: Room IDs to keep regardless (e.g. rooms with live sockets)
+            
+        Returns:
+            int: Number of rooms removed
+        """
+        idle = [Room.active_users == 0, Room.updated_at < cutoff]
+        exclude = list(exclude)
+        if exclude:
+            idle.append(Room.room_id.notin_(exclude))
+        
+        room_ids = [
+            room_id for (room_id,) in self.db.query(Room.room_id)
+            .filter(*idle)
+            .order_by(Room.updated_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        ]
+        if not room_ids:
+            return 0
+        
+        if archive:
+            self.db.execute(
+                insert(ArchivedRoom).from_select(
+                    ["room_id", "code", "code_compressed", "created_at", "updated_at"],
+                    select(
+                        Room.room_id, Room.code_text, Room.code_compressed,
+                        Room.created_at, Room.updated_at
+                    )
+                    .where(Room.room_id.in_(room_ids))
+                )
+            )
+        else:
+            # Archived rooms keep their files under the same room_id
+            self.db.query(RoomFile).filter(RoomFile.room_id.in_(room_ids)).delete(
+                synchronize_session=False
+            )
+        
+        deleted = self.db.query(Room).filter(Room.room_id.in_(room_ids)).delete(
+            synchronize_session=False
+        )
+        self.db.commit()
+        for room_id in room_ids:
+            search_index.remove_room(room_id)
+        return deleted
+    
+    def search_code(self, pattern: str, limit: int) -> List[Tuple[str, Optional[str], str]]:
+        """
+        Find rooms and files whose plain-text code matches an ILIKE pattern.
+        
+        On PostgreSQL this is served by the pg_trgm GIN indexes created by init_db.
+        
+        Args:
+            pattern: ILIKE pattern, with backslash as the escape character
+            limit: Maximum number of documents
+            
+        Returns:
+            List of (room_id, path, code), path None for the room's main document
+        """
+        rooms = (
+            self.db.query(Room.room_id, Room.code_text)
+            .filter(Room.code_text.ilike(pattern, escape="\\"))
+            .limit(limit)
+            .all()
+        )
+        results = [(room_id, None, code) for room_id, code in rooms]
+        if len(results) < limit:
+            # Files of archived rooms stay behind under their room_id: skip them
+            files = (
+                self.db.query(RoomFile.room_id, RoomFile.path, RoomFile.code_text)
+                .join(Room, Room.room_id == RoomFile.room_id)
+                .filter(RoomFile.code_text.ilike(pattern, escape="\\"))
+                .limit(limit - len(results))
+                .all()
+            )
+            results.extend(files)
+        return results
+    
+    def iter_documents(self, batch_size: int = 500) -> Iterator[Tuple[Tuple[str, Optional[str]], str]]:
+        """
+        Iterate over the code of every room and file, in keyset batches.
+        
+        Args:
+            batch_size: Rows loaded per query
+            
+        Yields:
+            ((room_id, path), code), path None for the room's main document
+        """
+        after = None
+        while True:
+            query = self.db.query(Room).order_by(Room.room_id)
+            if after is not None:
+                query = query.filter(Room.room_id > after)
+            rooms = query.limit(batch_size).all()
+            if not rooms:
+                break
+            for room in rooms:
+                yield (room.room_id, None), room.code
+            after = rooms[-1].room_id
+            self.db.expunge_all()
+        
+        after = None
+        while True:
+            query = (
+                self.db.query(RoomFile)
+                .join(Room, Room.room_id == RoomFile.room_id)
+                .order_by(RoomFile.room_id, RoomFile.path)
+            )
+            if after is not None:
+                query = query.filter(tuple_(RoomFile.room_id, RoomFile.path) > tuple_(*after))
+            files = query.limit(batch_size).all()
+            if not files:
+                break
+            for room_file in files:
+                yield (room_file.room_id, room_file.path), room_file.code
+            after = (files[-1].room_id, files[-1].path)
+            self.db.expunge_all()
@@ -0,0 +1,169 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import re
+import threading
+
+# (room_id, path) of an indexed document; path is None for the room's main document
+DocumentKey = Tuple[str, Optional[str]]
+
+
+def trigrams(text: str) -> Set[str]:
+    """Set of lowercase character trigrams of a text."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def find_snippets(code: str, query: str, limit: int = 3, width: int = 200) -> List[dict]:
+    """
+    Find the lines of a document containing a query, case-insensitively.
+    
+    Args:
+        code: The document
+        query: The text to find
+        limit: Maximum number of snippets
+        width: Maximum characters per snippet
+    
+    Returns:
+        List[dict]: Snippets with 1-based "line" and "text"
+    """
+    snippets = []
+    position = 0
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    while len(snippets) < limit:
+        match = pattern.search(code, position)
+        if match is None:
+            break
+        start = code.rfind("\n", 0, match.start()) + 1
+        end = code.find("\n", match.end())
+        end = len(code) if end == -1 else end
+        snippets.append({
+            "line": code.count("\n", 0, match.start()) + 1,
+            "text": code[start:end][:width]
+        })
+        position = end + 1
+    return snippets
+
+
+class TrigramIndex:
+    """
+    In-process trigram index over room documents, for SQLite and local runs.
+    
+    Saves only record the new text; the trigram postings of changed
+    documents are updated incrementally (added and removed trigrams only)
+    at the next search. The index is built from the database on first use,
+    and updates before that are ignored since the build reads the saved rows.
+    """
+    
+    def __init__(self):
+        self.documents: Dict[DocumentKey, str] = {}
+        self.document_trigrams: Dict[DocumentKey, Set[str]] = {}
+        self.postings: Dict[str, Set[DocumentKey]] = {}
+        # Documents saved since the last search: key -> new text, or None if deleted
+        self.pending: Dict[DocumentKey, Optional[str]] = {}
+        self.active = False
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+    
+    def update(self, room_id: str, path: Optional[str], code: str) -> None:
+        """Record a saved document."""
+        if self.active:
+            with self._lock:
+                self.pending[(room_id, path)] = code
+    
+    def remove(self, room_id: str, path: Optional[str]) -> None:
+        """Record a deleted document."""
+        if self.active:
+            with self._lock:
+                self.pending[(room_id, path)] = None
+    
+    def remove_room(self, room_id: str) -> None:
+        """Record the deletion of a room and all its files."""
+        if self.active:
+            with self._lock:
+                keys = [key for key in (*self.documents, *self.pending) if key[0] == room_id]
+                for key in keys:
+                    self.pending[key] = None
+    
+    def ensure_loaded(self, load: Callable[[], Iterable[Tuple[DocumentKey, str]]]) -> None:
+        """
+        Build the index on first use.
+        
+        Args:
+            load: Returns all (key, code) documents from the database
+        """
+        # Concurrent first searches wait for the one building the index
+        with self._load_lock:
+            if self.loaded:
+                return
+            with self._lock:
+                # Saves from now on are recorded, and take precedence over the loaded rows
+                self.active = True
+            for key, code in load():
+                with self._lock:
+                    self.pending.setdefault(key, code)
+            self.loaded = True
+    
+    def _apply_pending(self) -> None:
+        pending, self.pending = self.pending, {}
+        for key, code in pending.items():
+            old = self.document_trigrams.pop(key, set())
+            new = trigrams(code) if code else set()
+            
+            for trigram in old - new:
+                postings = self.postings[trigram]
+                postings.discard(key)
+                if not postings:
+                    del self.postings[trigram]
+            for trigram in new - old:
+                self.postings.setdefault(trigram, set()).add(key)
+            
+            if code is None:
+                self.documents.pop(key, None)
+            else:
+                self.documents[key] = code
+                self.document_trigrams[key] = new
+    
+    def search(self, query: str, limit: int) -> List[Tuple[DocumentKey, List[dict]]]:
+        """
+        Find documents containing a query of at least 3 characters.
+        
+        Args:
+            query: The text to find, case-insensitively
+            limit: Maximum number of documents
+        
+        Returns:
+            List of (key, snippets), ordered by room ID then path
+        """
+        with self._lock:
+            self._apply_pending()
+            
+            # Intersect postings, rarest trigram first
+            postings = sorted(
+                (self.postings.get(trigram, set()) for trigram in trigrams(query)),
+                key=len
+            )
+            if not postings:
+                return []
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    return []
+            # Main document (path None) first within a room
+            keys = sorted(candidates, key=lambda key: (key[0], key[1] is not None, key[1] or ""))
+            documents = self.documents
+        
+        # Trigram matches are candidates only: verify them one at a time until the limit is reached
+        results = []
+        for key in keys:
+            code = documents.get(key)
+            snippets = find_snippets(code, query) if code is not None else []
+            if snippets:
+                results.append((key, snippets))
+                if len(results) == limit:
+                    break
+        return results
+
+
+# Global in-process search index
+search_index = TrigramIndex()
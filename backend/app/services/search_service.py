@@ -0,0 +1,93 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import logging
+
+from app.config import settings
+from app.services.room_service import RoomService
+from app.services.search_index import search_index, find_snippets
+
+logger = logging.getLogger(__name__)
+
+# Whether the pg_trgm extension is installed, checked once per process
+_pg_trgm_installed: Optional[bool] = None
+_warned_memory_on_postgres = False
+
+
+def escape_like(query: str) -> str:
+    """Escape LIKE wildcards, using backslash as the escape character."""
+    return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class SearchService:
+    """Service for full-text search across room contents."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def backend(self) -> Optional[str]:
+        """
+        Pick the search backend.
+        
+        PostgreSQL with pg_trgm serves searches from its GIN indexes, as long
+        as code is stored as plain text (compressed rows cannot be matched in
+        SQL). Other databases use the in-process trigram index. On PostgreSQL
+        the in-process index is only used when SEARCH_BACKEND=memory is set
+        explicitly: it is per worker, only sees that worker's saves and holds
+        every document in memory.
+        
+        Returns:
+            str or None: "postgres", "memory", or None if search is unavailable
+        """
+        global _pg_trgm_installed, _warned_memory_on_postgres
+        
+        postgres = self.db.get_bind().dialect.name == "postgresql"
+        if settings.search_backend == "memory":
+            if postgres and not _warned_memory_on_postgres:
+                _warned_memory_on_postgres = True
+                logger.warning("Using the in-process search index on PostgreSQL: results are per worker")
+            return "memory"
+        if not postgres:
+            return "memory" if settings.search_backend == "auto" else None
+        if settings.code_storage != "text":
+            return None
+        
+        if _pg_trgm_installed is None:
+            _pg_trgm_installed = self.db.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first() is not None
+            if not _pg_trgm_installed:
+                logger.warning("pg_trgm is not installed, room search is unavailable (run init_db.py)")
+        return "postgres" if _pg_trgm_installed else None
+    
+    def search(self, query: str, limit: int) -> Optional[List[dict]]:
+        """
+        Find room documents containing a query, case-insensitively.
+        
+        The first in-process search builds the index from the database, so
+        call this from a worker thread, not the event loop.
+        
+        Args:
+            query: The text to find (at least 3 characters, so it has a trigram)
+            limit: Maximum number of documents
+        
+        Returns:
+            List[dict] or None: Results with "room_id", "path" and line
+            "snippets", or None if no search backend is available
+        """
+        backend = self.backend()
+        if backend is None:
+            return None
+        
+        if backend == "postgres":
+            rows = RoomService(self.db).search_code(f"%{escape_like(query)}%", limit)
+            return [
+                {"room_id": room_id, "path": path, "snippets": find_snippets(code, query)}
+                for room_id, path, code in rows
+            ]
+        
+        search_index.ensure_loaded(RoomService(self.db).iter_documents)
+        return [
+            {"room_id": room_id, "path": path, "snippets": snippets}
+            for (room_id, path), snippets in search_index.search(query, limit)
+        ]
@@ -1,9 +1,13 @@
-from typing import Dict, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import WebSocket
 import json
 import logging
 import uuid
 
+from app.config import settings
+from app.websockets.room_actor import RoomActor, MAIN_FILE
+from app.websockets.spectators import SpectatorFanout
+
 logger = logging.getLogger(__name__)
 
 # Color palette for different users (vibrant colors)
@@ -23,11 +27,22 @@ COLOR_PALETTE = [
 
 class UserConnection:
     """Represents a user connection with ID and color."""
-    def __init__(self, websocket: WebSocket, user_id: str = None, color: str = None):
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str = None,
+        color: str = None,
+        accepts_patches: bool = False,
+        spectator: bool = False
+    ):
         self.websocket = websocket
         self.user_id = user_id or str(uuid.uuid4())[:8]  # Generate short ID
         self.color = color or "#808080"  # Default gray
         self.cursor_position = 0
+        self.accepts_patches = accepts_patches  # Receives code_patch instead of full code_update
+        self.spectator = spectator  # Read-only, served by the room's SpectatorFanout
+        # Files whose updates this user receives; MAIN_FILE is added when the user is synced
+        self.subscriptions: Set[Optional[str]] = set()
 
 
 class ConnectionManager:
@@ -37,14 +52,25 @@ class ConnectionManager:
         # Dictionary mapping room_id to dict of user_id -> UserConnection
         self.active_connections: Dict[str, Dict[str, UserConnection]] = {}
         self.user_colors: Dict[str, int] = {}  # Track color index per room
+        self.room_actors: Dict[str, RoomActor] = {}  # One actor task per active room
+        # Actors of emptied rooms that are still flushing their last tick
+        self.stopping_actors: Dict[str, RoomActor] = {}
+        # Counters of actors that have exited
+        self.stopped_messages_in = 0
+        self.stopped_frames_out = 0
+        # Read-only connections, kept apart from editors: room_id -> user_id -> UserConnection
+        self.spectators: Dict[str, Dict[str, UserConnection]] = {}
+        self.spectator_fanouts: Dict[str, SpectatorFanout] = {}
+        self.stopped_spectator_frames = 0  # Frames sent by fan-outs that have stopped
     
-    async def connect(self, room_id: str, websocket: WebSocket) -> Tuple[str, str]:
+    async def connect(self, room_id: str, websocket: WebSocket, accepts_patches: bool = False) -> Tuple[str, str]:
         """
         Register a new WebSocket connection for a room.
         
         Args:
             room_id: The room identifier
             websocket: The WebSocket connection
+            accepts_patches: Whether the client understands code_patch frames
             
         Returns:
             Tuple[str, str]: (user_id, color) assigned to this connection
@@ -61,13 +87,41 @@ class ConnectionManager:
         self.user_colors[room_id] += 1
         
         # Create user connection
-        user_connection = UserConnection(websocket, color=color)
+        user_connection = UserConnection(websocket, color=color, accepts_patches=accepts_patches)
         self.active_connections[room_id][user_connection.user_id] = user_connection
         
         logger.info(f"User {user_connection.user_id} connected to room {room_id} with color {color}. Active users: {len(self.active_connections[room_id])}")
         
+        self.mark_presence_dirty(room_id)
+        
         return user_connection.user_id, color
     
+    async def connect_spectator(self, room_id: str, websocket: WebSocket) -> str:
+        """
+        Register a read-only spectator connection for a room.
+        
+        Args:
+            room_id: The room identifier
+            websocket: The WebSocket connection
+            
+        Returns:
+            str: user_id assigned to this connection
+        """
+        await websocket.accept()
+        
+        user_connection = UserConnection(websocket, spectator=True)
+        self.spectators.setdefault(room_id, {})[user_connection.user_id] = user_connection
+        
+        if room_id not in self.spectator_fanouts:
+            self.spectator_fanouts[room_id] = SpectatorFanout(
+                room_id, self, settings.ws_spectator_interval, settings.ws_spectator_send_timeout
+            )
+        self.mark_presence_dirty(room_id)
+        
+        logger.info(f"Spectator {user_connection.user_id} connected to room {room_id}. Spectators: {len(self.spectators[room_id])}")
+        
+        return user_connection.user_id
+    
     async def disconnect(self, room_id: str, user_id: str) -> None:
         """
         Unregister a WebSocket connection from a room.
@@ -76,6 +130,18 @@ class ConnectionManager:
             room_id: The room identifier
             user_id: The user identifier
         """
+        if user_id in self.spectators.get(room_id, {}):
+            del self.spectators[room_id][user_id]
+            if not self.spectators[room_id]:
+                del self.spectators[room_id]
+                fanout = self.spectator_fanouts.pop(room_id)
+                fanout.stop()
+                self.stopped_spectator_frames += fanout.frames_out
+            else:
+                self.mark_presence_dirty(room_id)
+            logger.info(f"Spectator {user_id} disconnected from room {room_id}")
+            return
+        
         if room_id in self.active_connections:
             if user_id in self.active_connections[room_id]:
                 del self.active_connections[room_id][user_id]
@@ -85,29 +151,234 @@ class ConnectionManager:
                 del self.active_connections[room_id]
                 if room_id in self.user_colors:
                     del self.user_colors[room_id]
+                if room_id in self.room_actors:
+                    # The actor flushes pending edits before exiting; keep it
+                    # registered until then so a rejoin does not start from a stale row
+                    actor = self.room_actors.pop(room_id)
+                    self.stopping_actors[room_id] = actor
+                    actor.add_done_callback(self._forget_stopped_actor)
+                    actor.stop()
             
+            self.mark_presence_dirty(room_id)
             logger.info(f"User {user_id} disconnected from room {room_id}")
     
-    async def broadcast(self, room_id: str, message: dict) -> None:
+    def has_patch_clients(self, room_id: str, file: Optional[str] = MAIN_FILE) -> bool:
+        """
+        Check whether any subscriber of a file accepts patches.
+        
+        Args:
+            room_id: The room identifier
+            file: The file path, MAIN_FILE for the room's own document
+            
+        Returns:
+            bool: True if at least one subscriber accepts code_patch frames
+        """
+        return any(
+            user_conn.accepts_patches and file in user_conn.subscriptions
+            for user_conn in self.active_connections.get(room_id, {}).values()
+        )
+    
+    def has_subscribers(self, room_id: str, file: Optional[str]) -> bool:
+        """
+        Check whether any connection in a room has a file open.
+        
+        Args:
+            room_id: The room identifier
+            file: The file path
+            
+        Returns:
+            bool: True if at least one connection is subscribed to the file
+        """
+        return any(
+            file in user_conn.subscriptions
+            for user_conn in self.active_connections.get(room_id, {}).values()
+        )
+    
+    def subscribe(self, room_id: str, user_id: str, file: Optional[str]) -> None:
+        """
+        Start sending a file's updates to a user.
+        
+        Args:
+            room_id: The room identifier
+            user_id: The user identifier
+            file: The file path
+        """
+        user_conn = self.active_connections.get(room_id, {}).get(user_id)
+        if user_conn is not None:
+            user_conn.subscriptions.add(file)
+    
+    def unsubscribe(self, room_id: str, user_id: str, file: Optional[str]) -> None:
+        """
+        Stop sending a file's updates to a user.
+        
+        Args:
+            room_id: The room identifier
+            user_id: The user identifier
+            file: The file path
+        """
+        user_conn = self.active_connections.get(room_id, {}).get(user_id)
+        if user_conn is not None:
+            user_conn.subscriptions.discard(file)
+    
+    def is_subscribed(self, room_id: str, user_id: str, file: Optional[str]) -> bool:
+        """
+        Check whether a user has a file open.
+        
+        Args:
+            room_id: The room identifier
+            user_id: The user identifier
+            file: The file path
+            
+        Returns:
+            bool: True if the user is subscribed to the file
+        """
+        user_conn = self.active_connections.get(room_id, {}).get(user_id)
+        return user_conn is not None and file in user_conn.subscriptions
+    
+    async def close_file(self, room_id: str, file: Optional[str], message: dict) -> None:
+        """
+        Unsubscribe every connection in a room from a file and notify them.
+        
+        Args:
+            room_id: The room identifier
+            file: The file path
+            message: The message to send to the former subscribers
+        """
+        subscribers = [
+            user_conn for user_conn in self.active_connections.get(room_id, {}).values()
+            if file in user_conn.subscriptions
+        ]
+        for user_conn in subscribers:
+            user_conn.subscriptions.discard(file)
+        await self._send_all(room_id, subscribers, message, None)
+    
+    def publish_to_spectators(self, room_id: str, message: dict) -> None:
+        """
+        Hand an editor broadcast to the room's spectator fan-out, without waiting.
+        
+        Args:
+            room_id: The room identifier
+            message: A code_update or cursor_update frame
+        """
+        fanout = self.spectator_fanouts.get(room_id)
+        if fanout is not None:
+            fanout.publish(message)
+    
+    def mark_presence_dirty(self, room_id: str) -> None:
+        """
+        Schedule updated user counts for the room's spectators.
+        
+        Args:
+            room_id: The room identifier
+        """
+        fanout = self.spectator_fanouts.get(room_id)
+        if fanout is not None:
+            fanout.mark_presence_dirty()
+    
+    async def get_actor(self, room_id: str, code: str) -> RoomActor:
+        """
+        Get the actor owning a room, starting it if needed.
+        
+        If the room's previous actor is still flushing, waits for it and
+        starts from its final document instead of the given one.
+        
+        Args:
+            room_id: The room identifier
+            code: The persisted document, used when starting a new actor
+            
+        Returns:
+            RoomActor: The room's actor
+        """
+        revision = 0
+        stopping = self.stopping_actors.get(room_id)
+        if stopping is not None:
+            await stopping.wait_stopped()
+            code, revision = stopping.code, stopping.revision()
+        
+        actor = self.room_actors.get(room_id)
+        if actor is None:
+            actor = RoomActor(
+                room_id, code, self, settings.ws_tick_interval, settings.ws_diff_max_edits, revision
+            )
+            self.room_actors[room_id] = actor
+        return actor
+    
+    def _forget_stopped_actor(self, actor: RoomActor) -> None:
+        self.stopped_messages_in += actor.messages_in
+        self.stopped_frames_out += actor.frames_out
+        if self.stopping_actors.get(actor.room_id) is actor:
+            del self.stopping_actors[actor.room_id]
+    
+    def get_actor_stats(self) -> dict:
+        """
+        Get room actor counters since startup.
+        
+        Returns:
+            dict: Live actors, inbound messages posted to actors and frames they broadcast
+        """
+        actors = [*self.room_actors.values(), *self.stopping_actors.values()]
+        return {
+            "active": len(self.room_actors),
+            "messages_in": self.stopped_messages_in + sum(actor.messages_in for actor in actors),
+            "frames_out": self.stopped_frames_out + sum(actor.frames_out for actor in actors)
+        }
+    
+    async def broadcast(self, room_id: str, message: dict, patch_message: Optional[dict] = None) -> None:
         """
         Broadcast a message to all connections in a room.
         
         Args:
             room_id: The room identifier
             message: The message to broadcast (will be JSON serialized)
+            patch_message: Sent instead of message to connections that accept patches
+        """
+        if room_id in self.active_connections:
+            await self._send_all(room_id, list(self.active_connections[room_id].values()), message, patch_message)
+    
+    async def broadcast_file(
+        self,
+        room_id: str,
+        file: Optional[str],
+        message: dict,
+        patch_message: Optional[dict] = None
+    ) -> None:
+        """
+        Broadcast a message to the connections in a room subscribed to a file.
+        
+        Args:
+            room_id: The room identifier
+            file: The file path, MAIN_FILE for the room's own document
+            message: The message to broadcast (will be JSON serialized)
+            patch_message: Sent instead of message to connections that accept patches
         """
         if room_id in self.active_connections:
-            disconnected = []
-            for user_id, user_conn in list(self.active_connections[room_id].items()):
-                try:
+            subscribers = [
+                user_conn for user_conn in self.active_connections[room_id].values()
+                if file in user_conn.subscriptions
+            ]
+            await self._send_all(room_id, subscribers, message, patch_message)
+    
+    async def _send_all(
+        self,
+        room_id: str,
+        connections: List[UserConnection],
+        message: dict,
+        patch_message: Optional[dict]
+    ) -> None:
+        disconnected = []
+        for user_conn in connections:
+            try:
+                if patch_message is not None and user_conn.accepts_patches:
+                    await user_conn.websocket.send_json(patch_message)
+                else:
                     await user_conn.websocket.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to connection {user_id}: {e}")
-                    disconnected.append(user_id)
-            
-            # Remove failed connections
-            for user_id in disconnected:
-                await self.disconnect(room_id, user_id)
+            except Exception as e:
+                logger.error(f"Error broadcasting to connection {user_conn.user_id}: {e}")
+                disconnected.append(user_conn.user_id)
+        
+        # Remove failed connections
+        for user_id in disconnected:
+            await self.disconnect(room_id, user_id)
     
     async def send_personal(self, websocket: WebSocket, message: dict) -> None:
         """
@@ -171,6 +442,29 @@ class ConnectionManager:
             int: Number of active connections
         """
         return len(self.active_connections.get(room_id, {}))
+    
+    def get_spectator_frames(self) -> int:
+        """
+        Get the number of frames sent to spectators since startup.
+        
+        Returns:
+            int: Frames sent by running and stopped fan-outs
+        """
+        return self.stopped_spectator_frames + sum(
+            fanout.frames_out for fanout in self.spectator_fanouts.values()
+        )
+    
+    def get_spectator_count(self, room_id: str) -> int:
+        """
+        Get the number of spectators in a room.
+        
+        Args:
+            room_id: The room identifier
+            
+        Returns:
+            int: Number of spectator connections
+        """
+        return len(self.spectators.get(room_id, {}))
 
 
 # Global connection manager instance
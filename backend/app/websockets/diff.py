@@ -0,0 +1,170 @@
+from typing import List, Optional, Tuple
+
+# A patch operation: (offset in the old document, characters to delete, text to insert).
+# Offsets are in Unicode code points; operations are sorted and never overlap.
+PatchOp = Tuple[int, int, str]
+
+# Block size used to find the first mismatch with C-speed slice comparisons
+_SCAN_BLOCK = 4096
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    """Length of the longest common prefix of a and b."""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n:
+        j = min(i + _SCAN_BLOCK, n)
+        if a[i:j] != b[i:j]:
+            while a[i] == b[i]:
+                i += 1
+            return i
+        i = j
+    return n
+
+
+def common_suffix_length(a: str, b: str, limit: int) -> int:
+    """Length of the longest common suffix of a and b, at most limit."""
+    n = min(len(a), len(b), limit)
+    i = 0
+    while i < n:
+        j = min(i + _SCAN_BLOCK, n)
+        if a[len(a) - j:len(a) - i] != b[len(b) - j:len(b) - i]:
+            while a[len(a) - 1 - i] == b[len(b) - 1 - i]:
+                i += 1
+            return i
+        i = j
+    return n
+
+
+def myers_diff(a: List[str], b: List[str], max_edits: int) -> Optional[List[Tuple[int, int, int, int]]]:
+    """
+    Myers' O((N+M)D) shortest edit script between two sequences.
+    
+    Args:
+        a: Old sequence
+        b: New sequence
+        max_edits: Give up once the edit distance exceeds this
+    
+    Returns:
+        List of (a_start, a_end, b_start, b_end) hunks where a[a_start:a_end]
+        is replaced by b[b_start:b_end], or None if there are too many edits
+    """
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    
+    for d in range(min(n + m, max_edits) + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    
+    return None
+
+
+def _backtrack(trace: List[dict], n: int, m: int) -> List[Tuple[int, int, int, int]]:
+    """Turn the Myers trace into hunks, in order."""
+    hunks: List[List[int]] = []
+    x, y = n, m
+    
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        
+        # Skip the diagonal (unchanged elements)
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+        
+        if d > 0:
+            # One insertion (x unchanged) or one deletion, merged into the current hunk if adjacent
+            if hunks and hunks[-1][0] == x and hunks[-1][2] == y:
+                hunk = hunks[-1]
+            else:
+                hunk = [x, x, y, y]
+                hunks.append(hunk)
+            hunk[0], hunk[2] = prev_x, prev_y
+        
+        x, y = prev_x, prev_y
+    
+    return [tuple(hunk) for hunk in reversed(hunks)]
+
+
+def compute_patch(old: str, new: str, max_edits: int = 64) -> List[PatchOp]:
+    """
+    Compute a compact patch turning old into new.
+    
+    Trims the common prefix and suffix, then runs a line-level Myers diff
+    on the middle. If the middle needs more than max_edits line edits the
+    whole middle is replaced in a single operation.
+    
+    Args:
+        old: Previous document
+        new: New document
+        max_edits: Maximum line edits for the Myers fallback
+    
+    Returns:
+        List[PatchOp]: Operations to apply to old, sorted by offset
+    """
+    if old == new:
+        return []
+    
+    prefix = common_prefix_length(old, new)
+    suffix = common_suffix_length(old, new, min(len(old), len(new)) - prefix)
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+    
+    if not old_mid or not new_mid:
+        return [(prefix, len(old_mid), new_mid)]
+    
+    old_lines = old_mid.splitlines(keepends=True)
+    new_lines = new_mid.splitlines(keepends=True)
+    hunks = myers_diff(old_lines, new_lines, max_edits)
+    if hunks is None:
+        return [(prefix, len(old_mid), new_mid)]
+    
+    # Character offset of each line start in old_mid
+    line_offsets = [0]
+    for line in old_lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+    
+    return [
+        (
+            prefix + line_offsets[a_start],
+            line_offsets[a_end] - line_offsets[a_start],
+            "".join(new_lines[b_start:b_end])
+        )
+        for a_start, a_end, b_start, b_end in hunks
+    ]
+
+
+def apply_patch(old: str, ops: List[PatchOp]) -> str:
+    """Apply patch operations produced by compute_patch."""
+    parts = []
+    position = 0
+    for offset, delete, insert in ops:
+        parts.append(old[position:offset])
+        parts.append(insert)
+        position = offset + delete
+    parts.append(old[position:])
+    return "".join(parts)
+
+
+def patch_size(ops: List[PatchOp]) -> int:
+    """Rough encoded size of a patch, to compare against sending the full text."""
+    return sum(len(insert) + 16 for _, _, insert in ops)
@@ -0,0 +1,161 @@
+from typing import Dict, Tuple
+import logging
+import time
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bucket key for actions that have no dedicated limit configured
+DEFAULT_ACTION = "default"
+
+
+class TokenBucket:
+    """Classic token bucket: refills at `rate` tokens/second up to `capacity`."""
+    
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+    
+    def consume(self, tokens: float = 1.0) -> bool:
+        """
+        Try to take tokens from the bucket.
+        
+        Args:
+            tokens: Number of tokens to take
+        
+        Returns:
+            bool: True if the tokens were available, False if throttled
+        """
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+
+class RateLimiter:
+    """
+    Per-connection and per-room token bucket rate limiting for inbound
+    WebSocket actions, with counters for throttled and oversized frames.
+    """
+    
+    def __init__(
+        self,
+        connection_limits: Dict[str, Tuple[float, float]],
+        room_limits: Dict[str, Tuple[float, float]],
+    ):
+        # action -> (rate per second, burst capacity)
+        self.connection_limits = connection_limits
+        self.room_limits = room_limits
+        
+        # (room_id, user_id) -> action -> TokenBucket
+        self.connection_buckets: Dict[Tuple[str, str], Dict[str, TokenBucket]] = {}
+        # room_id -> action -> TokenBucket
+        self.room_buckets: Dict[str, Dict[str, TokenBucket]] = {}
+        
+        # Counters
+        self.throttled: Dict[str, int] = {}
+        self.oversized_frames = 0
+        self.oversized_documents = 0
+    
+    def _bucket(
+        self,
+        buckets: Dict[str, TokenBucket],
+        limits: Dict[str, Tuple[float, float]],
+        key: str,
+    ) -> TokenBucket:
+        """Get or lazily create the bucket for a bucket key."""
+        bucket = buckets.get(key)
+        if bucket is None:
+            rate, burst = limits[key]
+            bucket = TokenBucket(rate, burst)
+            buckets[key] = bucket
+        return bucket
+    
+    def allow(self, room_id: str, user_id: str, action: str) -> bool:
+        """
+        Check whether an inbound action may be processed.
+        
+        The connection bucket is checked first so that a single noisy client
+        exhausts its own budget before it can drain the shared room budget.
+        
+        Args:
+            room_id: The room identifier
+            user_id: The user identifier
+            action: The inbound action name
+        
+        Returns:
+            bool: True if allowed, False if the message should be dropped
+        """
+        connection_buckets = self.connection_buckets.setdefault((room_id, user_id), {})
+        room_buckets = self.room_buckets.setdefault(room_id, {})
+        
+        # Unconfigured actions share the default buckets and counter, so
+        # client-chosen action names cannot grow these dicts
+        connection_key = action if action in self.connection_limits else DEFAULT_ACTION
+        room_key = action if action in self.room_limits else DEFAULT_ACTION
+        
+        allowed = (
+            self._bucket(connection_buckets, self.connection_limits, connection_key).consume()
+            and self._bucket(room_buckets, self.room_limits, room_key).consume()
+        )
+        
+        if not allowed:
+            self.throttled[connection_key] = self.throttled.get(connection_key, 0) + 1
+        return allowed
+    
+    def record_oversized_frame(self, room_id: str, size: int) -> None:
+        """Count a frame rejected for exceeding the maximum frame size."""
+        self.oversized_frames += 1
+        logger.warning(f"Rejected {size}-byte frame in room {room_id}")
+    
+    def record_oversized_document(self, room_id: str, size: int) -> None:
+        """Count an update rejected for exceeding the maximum document size."""
+        self.oversized_documents += 1
+        logger.warning(f"Rejected {size}-byte document in room {room_id}")
+    
+    def forget_connection(self, room_id: str, user_id: str) -> None:
+        """Drop the buckets of a disconnected user."""
+        self.connection_buckets.pop((room_id, user_id), None)
+    
+    def forget_room(self, room_id: str) -> None:
+        """Drop the shared buckets of a room that has emptied."""
+        self.room_buckets.pop(room_id, None)
+    
+    def get_stats(self) -> dict:
+        """
+        Get throttling counters.
+        
+        Returns:
+            dict: Throttled message counts per bucket key and oversized frame counts
+        """
+        return {
+            "throttled": dict(self.throttled),
+            "throttled_total": sum(self.throttled.values()),
+            "oversized_frames": self.oversized_frames,
+            "oversized_documents": self.oversized_documents,
+        }
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter(
+    connection_limits={
+        "update": (settings.ws_update_rate, settings.ws_update_burst),
+        "cursor_position": (settings.ws_cursor_rate, settings.ws_cursor_burst),
+        DEFAULT_ACTION: (settings.ws_default_rate, settings.ws_default_burst),
+    },
+    room_limits={
+        "update": (settings.ws_room_update_rate, settings.ws_room_update_burst),
+        "cursor_position": (settings.ws_room_cursor_rate, settings.ws_room_cursor_burst),
+        DEFAULT_ACTION: (settings.ws_room_default_rate, settings.ws_room_default_burst),
+    },
+)
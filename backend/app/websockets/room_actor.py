@@ -0,0 +1,286 @@
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import asyncio
+import logging
+
+from app.db import SessionLocal
+from app.services.room_service import RoomService
+from app.websockets.diff import compute_patch, patch_size
+
+if TYPE_CHECKING:
+    from app.websockets.connection_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Key of the room's own document (rooms.code); additional files are keyed by path
+MAIN_FILE = None
+
+
+class RoomActor:
+    """
+    Single task that owns the state of an active room.
+    
+    Socket handlers never mutate the room directly: they post messages to
+    the actor's inbox. Every tick the actor drains the inbox, applies the
+    edits in arrival order, persists each changed document once and
+    broadcasts one `code_update` per document (plus the latest cursor of
+    each user) to that document's subscribers, instead of one frame per
+    inbound message.
+    
+    Each document has a revision, bumped once per broadcast tick. A new
+    document text becomes visible in `documents` in the same step as its
+    subscribers are captured for the broadcast, so a snapshot read (and
+    subscribed to) at any time is exactly the base of the next update.
+    """
+    
+    def __init__(
+        self,
+        room_id: str,
+        code: str,
+        manager: "ConnectionManager",
+        tick_interval: float,
+        diff_max_edits: int = 64,
+        revision: int = 0
+    ):
+        self.room_id = room_id
+        self.manager = manager
+        self.tick_interval = tick_interval
+        self.diff_max_edits = diff_max_edits
+        # Open documents: MAIN_FILE plus files loaded on first subscribe
+        self.documents: Dict[Optional[str], str] = {MAIN_FILE: code}
+        # Revision of each document, kept when a file is closed so it stays monotonic
+        self.revisions: Dict[Optional[str], int] = {MAIN_FILE: revision}
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.messages_in = 0
+        self.frames_out = 0
+        self._load_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+    
+    @property
+    def code(self) -> str:
+        """The room's main document."""
+        return self.documents[MAIN_FILE]
+    
+    def revision(self, path: Optional[str] = MAIN_FILE) -> int:
+        """
+        Get the revision of a document.
+        
+        Args:
+            path: The file path, MAIN_FILE for the room's own document
+        
+        Returns:
+            int: Number of ticks that changed the document
+        """
+        return self.revisions.get(path, 0)
+    
+    async def open_file(self, path: str, user_id: str) -> Optional[str]:
+        """
+        Subscribe a user to a file, loading it from the database if needed.
+        
+        Args:
+            path: The file path within the room
+            user_id: The subscribing user
+        
+        Returns:
+            str or None: The file's current code, or None if the file does not exist
+        """
+        async with self._load_lock:
+            if path not in self.documents:
+                code = await asyncio.to_thread(self._load, path)
+                if code is None:
+                    return None
+                self.documents[path] = code
+            # Subscribe before yielding so the file cannot be evicted in between
+            self.manager.subscribe(self.room_id, user_id, path)
+            return self.documents[path]
+    
+    def post(self, message: dict) -> None:
+        """
+        Queue an inbound message for the next tick.
+        
+        Args:
+            message: Dict with "action", "user_id", "color", "file" and action fields
+        """
+        self.messages_in += 1
+        self.inbox.put_nowait(message)
+    
+    def close_file(self, path: str) -> None:
+        """
+        Close a deleted file at the next tick, discarding its pending edits.
+        
+        Args:
+            path: The file path within the room
+        """
+        self.inbox.put_nowait({"action": "file_deleted", "file": path})
+    
+    def stop(self) -> None:
+        """Ask the actor to flush pending messages and exit."""
+        self.inbox.put_nowait(None)
+    
+    async def wait_stopped(self) -> None:
+        """Wait until the actor has flushed and persisted its last tick."""
+        await asyncio.shield(self._task)
+    
+    def add_done_callback(self, callback) -> None:
+        """Call callback(actor) once the actor has exited."""
+        self._task.add_done_callback(lambda _: callback(self))
+    
+    async def _run(self) -> None:
+        running = True
+        while running:
+            first = await self.inbox.get()
+            if first is None:
+                break
+            
+            # Let the rest of the tick's messages accumulate
+            await asyncio.sleep(self.tick_interval)
+            
+            batch = [first]
+            while not self.inbox.empty():
+                message = self.inbox.get_nowait()
+                if message is None:
+                    running = False
+                    break
+                batch.append(message)
+            
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logger.error(f"Room actor {self.room_id} failed to flush {len(batch)} messages: {e}")
+        
+        logger.info(f"Room actor {self.room_id} stopped")
+    
+    async def _flush(self, batch: List[dict]) -> None:
+        # Edits go to working copies; documents change only when the tick is broadcast
+        working: Dict[Optional[str], str] = {}
+        previous_code: Dict[Optional[str], str] = {}
+        last_updates: Dict[Optional[str], dict] = {}
+        edits: Dict[Optional[str], int] = {}
+        # (file, user_id) -> latest cursor message, in order of last movement
+        cursors: Dict[Tuple[Optional[str], str], dict] = {}
+        deleted = set()
+        
+        for message in batch:
+            path = message.get("file", MAIN_FILE)
+            if path not in self.documents:
+                continue
+            
+            action = message["action"]
+            if action == "file_deleted":
+                deleted.add(path)
+            elif action == "update":
+                previous_code.setdefault(path, self.documents[path])
+                working[path] = message["code"]
+                last_updates[path] = message
+                edits[path] = edits.get(path, 0) + 1
+            elif action == "cursor_position":
+                key = (path, message["user_id"])
+                cursors.pop(key, None)
+                cursors[key] = message
+        
+        for path in deleted:
+            last_updates.pop(path, None)
+            await self._close_deleted_file(path)
+        
+        for path, last_update in last_updates.items():
+            await self._broadcast_update(path, previous_code[path], working[path], last_update, edits[path])
+        
+        for (path, user_id), message in cursors.items():
+            if path not in self.documents:
+                continue
+            cursor_update = {
+                "type": "cursor_update",
+                "user_id": user_id,
+                "color": message["color"],
+                "position": message.get("position"),
+                "line": message.get("line")
+            }
+            if path is not MAIN_FILE:
+                cursor_update["file"] = path
+            await self.manager.broadcast_file(self.room_id, path, cursor_update)
+            if path is MAIN_FILE:
+                self.manager.publish_to_spectators(self.room_id, cursor_update)
+            self.frames_out += 1
+        
+        # Free files nobody has open any more
+        for path in list(self.documents):
+            if path is not MAIN_FILE and not self.manager.has_subscribers(self.room_id, path):
+                del self.documents[path]
+    
+    async def _broadcast_update(
+        self,
+        path: Optional[str],
+        previous_code: str,
+        code: str,
+        last_update: dict,
+        edits: int
+    ) -> None:
+        saved = await asyncio.to_thread(self._persist, path, code)
+        if not saved and path is not MAIN_FILE:
+            # Deleted through another worker while open: stop accepting edits nobody can save
+            await self._close_deleted_file(path)
+            return
+        
+        # Patch-capable clients get a minimal diff of the whole tick, legacy clients the full text
+        ops = None
+        if self.manager.has_patch_clients(self.room_id, path):
+            ops = await asyncio.to_thread(compute_patch, previous_code, code, self.diff_max_edits)
+        
+        # No await from here until broadcast_file has captured the subscribers:
+        # anyone synced before this point gets the update, anyone synced after already has it
+        self.documents[path] = code
+        revision = self.revisions[path] = self.revision(path) + 1
+        
+        patch_message = None
+        if ops is not None and patch_size(ops) < len(code):
+            patch_message = {
+                "type": "code_patch",
+                "ops": ops,
+                "base_rev": revision - 1,
+                "rev": revision,
+                "base_length": len(previous_code),
+                "length": len(code),
+                "user_id": last_update["user_id"],
+                "color": last_update["color"],
+                "edits": edits
+            }
+        
+        code_update = {
+            "type": "code_update",
+            "code": code,
+            "rev": revision,
+            "user_id": last_update["user_id"],
+            "color": last_update["color"],
+            "edits": edits
+        }
+        if path is not MAIN_FILE:
+            code_update["file"] = path
+            if patch_message is not None:
+                patch_message["file"] = path
+        
+        await self.manager.broadcast_file(self.room_id, path, code_update, patch_message=patch_message)
+        if path is MAIN_FILE:
+            self.manager.publish_to_spectators(self.room_id, code_update)
+        self.frames_out += 1
+    
+    async def _close_deleted_file(self, path: str) -> None:
+        self.documents.pop(path, None)
+        await self.manager.close_file(self.room_id, path, {"type": "file_deleted", "file": path})
+        self.frames_out += 1
+        logger.info(f"Closed deleted file {path} in room {self.room_id}")
+    
+    def _load(self, path: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            room_file = RoomService(db).get_file(self.room_id, path)
+            return room_file.code if room_file else None
+        finally:
+            db.close()
+    
+    def _persist(self, path: Optional[str], code: str) -> bool:
+        db = SessionLocal()
+        try:
+            if path is MAIN_FILE:
+                return RoomService(db).update_code(self.room_id, code) is not None
+            return RoomService(db).update_file_code(self.room_id, path, code) is not None
+        finally:
+            db.close()
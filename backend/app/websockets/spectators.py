@@ -0,0 +1,105 @@
+from typing import Dict, List, Optional, TYPE_CHECKING
+import asyncio
+import logging
+
+if TYPE_CHECKING:
+    from app.websockets.connection_manager import ConnectionManager, UserConnection
+
+logger = logging.getLogger(__name__)
+
+
+class SpectatorFanout:
+    """
+    Throttled, batched delivery of room activity to read-only spectators.
+    
+    Editors publish into the fan-out without waiting on it: only the latest
+    code, the latest cursor of each editor and a dirty flag for presence are
+    kept. Every interval the fan-out sends what changed to all spectators
+    concurrently, from its own task, so hundreds of viewers never delay the
+    editors' broadcast.
+    """
+    
+    def __init__(self, room_id: str, manager: "ConnectionManager", interval: float, send_timeout: float):
+        self.room_id = room_id
+        self.manager = manager
+        self.interval = interval
+        self.send_timeout = send_timeout
+        self.pending_code: Optional[dict] = None
+        self.pending_cursors: Dict[str, dict] = {}
+        self.presence_dirty = True
+        self.frames_out = 0
+        self._stopped = False
+        self._task = asyncio.create_task(self._run())
+    
+    def publish(self, message: dict) -> None:
+        """
+        Record an editor broadcast for the next spectator batch.
+        
+        Args:
+            message: A `code_update` or `cursor_update` frame
+        """
+        if message["type"] == "code_update":
+            self.pending_code = message
+        elif message["type"] == "cursor_update":
+            self.pending_cursors[message["user_id"]] = message
+    
+    def mark_presence_dirty(self) -> None:
+        """Send updated editor and spectator counts with the next batch."""
+        self.presence_dirty = True
+    
+    def stop(self) -> None:
+        """Stop the fan-out task; from within the task itself, it exits after the current batch."""
+        self._stopped = True
+        if asyncio.current_task() is not self._task:
+            self._task.cancel()
+    
+    def _take_frames(self) -> List[dict]:
+        frames = []
+        if self.pending_code is not None:
+            frames.append(self.pending_code)
+            self.pending_code = None
+        if self.pending_cursors:
+            frames.extend(self.pending_cursors.values())
+            self.pending_cursors = {}
+        if self.presence_dirty:
+            frames.append({
+                "type": "presence",
+                "active_users": self.manager.get_active_users_count(self.room_id),
+                "spectators": self.manager.get_spectator_count(self.room_id)
+            })
+            self.presence_dirty = False
+        return frames
+    
+    async def _run(self) -> None:
+        while not self._stopped:
+            await asyncio.sleep(self.interval)
+            frames = self._take_frames()
+            if not frames:
+                continue
+            try:
+                await self._send_all(frames)
+            except Exception as e:
+                logger.error(f"Spectator fan-out failed in room {self.room_id}: {e}")
+    
+    async def _send_all(self, frames: List[dict]) -> None:
+        spectators = list(self.manager.spectators.get(self.room_id, {}).values())
+        results = await asyncio.gather(
+            *(self._send(spectator, frames) for spectator in spectators),
+            return_exceptions=True
+        )
+        self.frames_out += len(frames) * len(spectators)
+        
+        # Drop spectators that failed or were too slow to keep up; close the
+        # socket first, as disconnecting the last one stops this fan-out
+        for spectator, result in zip(spectators, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Dropping spectator {spectator.user_id} in room {self.room_id}: {result!r}")
+                try:
+                    await spectator.websocket.close()
+                except Exception:
+                    pass
+                await self.manager.disconnect(self.room_id, spectator.user_id)
+    
+    async def _send(self, spectator: "UserConnection", frames: List[dict]) -> None:
+        for frame in frames:
+            await asyncio.wait_for(spectator.websocket.send_json(frame), self.send_timeout)
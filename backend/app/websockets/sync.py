@@ -0,0 +1,149 @@
+from typing import Iterator, Optional, Tuple
+from fastapi import WebSocket
+import asyncio
+
+# Sync modes a client can request with the `sync` query parameter
+SYNC_FULL = "full"
+SYNC_STREAM = "stream"
+SYNC_LAZY = "lazy"
+SYNC_MODES = (SYNC_FULL, SYNC_STREAM, SYNC_LAZY)
+
+
+def line_range_to_offsets(code: str, start_line: int, end_line: int) -> Tuple[int, int]:
+    """
+    Convert an inclusive 1-based line range to character offsets.
+    
+    Args:
+        code: The document
+        start_line: First line of the range
+        end_line: Last line of the range
+    
+    Returns:
+        Tuple[int, int]: (start, end) offsets, end exclusive
+    """
+    start_line = max(1, start_line)
+    end_line = max(start_line, end_line)
+    
+    start = 0
+    for _ in range(start_line - 1):
+        newline = code.find("\n", start)
+        if newline == -1:
+            return len(code), len(code)
+        start = newline + 1
+    
+    end = start
+    for _ in range(end_line - start_line + 1):
+        newline = code.find("\n", end)
+        if newline == -1:
+            return start, len(code)
+        end = newline + 1
+    
+    return start, end
+
+
+def iter_chunks(code: str, chunk_size: int, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Split code[start:end] into bounded chunks.
+    
+    Args:
+        code: The document
+        chunk_size: Maximum characters per chunk
+        start: Offset to start at
+        end: Offset to stop at (defaults to the end of the document)
+    
+    Yields:
+        Tuple[int, str]: (offset, data) of each chunk
+    """
+    end = len(code) if end is None else end
+    for offset in range(start, end, chunk_size):
+        yield offset, code[offset:min(offset + chunk_size, end)]
+
+
+async def send_chunks(websocket: WebSocket, code: str, chunk_size: int, start: int = 0, end: Optional[int] = None) -> int:
+    """
+    Send a range of the document as `sync_chunk` frames.
+    
+    Yields to the event loop between chunks so broadcasts from other users
+    (e.g. `code_update`) can interleave with a long transfer.
+    
+    Returns:
+        int: Number of chunks sent
+    """
+    sent = 0
+    for offset, data in iter_chunks(code, chunk_size, start, end):
+        await websocket.send_json({
+            "type": "sync_chunk",
+            "offset": offset,
+            "data": data
+        })
+        sent += 1
+        await asyncio.sleep(0)
+    return sent
+
+
+async def stream_sync(
+    websocket: WebSocket,
+    code: str,
+    header: dict,
+    chunk_size: int,
+    visible: Optional[Tuple[int, int]] = None,
+    lazy: bool = False
+) -> None:
+    """
+    Send the initial document in bounded chunks instead of a single `sync` frame.
+    
+    The client receives a `sync` header with `length` but no `code`, then
+    `sync_chunk` frames carrying `offset` and `data`, then `sync_complete`.
+    If a visible line range is given its chunks are sent first. In lazy mode
+    only the visible range is sent and the client fetches the rest with the
+    `fetch_range` action; `sync_complete` then carries `"partial": true`.
+    `sync_complete` repeats the snapshot's `rev` from the header.
+    
+    Args:
+        websocket: The WebSocket connection
+        code: The document snapshot
+        header: Fields of the legacy `sync` frame other than `code`, including `rev`
+        chunk_size: Maximum characters per chunk
+        visible: Optional inclusive 1-based (start_line, end_line)
+        lazy: Only send the visible range
+    """
+    await websocket.send_json({
+        **header,
+        "type": "sync",
+        "streamed": True,
+        "length": len(code)
+    })
+    
+    chunks = 0
+    if visible is not None:
+        start, end = line_range_to_offsets(code, *visible)
+        chunks += await send_chunks(websocket, code, chunk_size, start, end)
+        if not lazy:
+            chunks += await send_chunks(websocket, code, chunk_size, 0, start)
+            chunks += await send_chunks(websocket, code, chunk_size, end)
+    else:
+        chunks += await send_chunks(websocket, code, chunk_size)
+    
+    await websocket.send_json({
+        "type": "sync_complete",
+        "rev": header.get("rev"),
+        "length": len(code),
+        "chunks": chunks,
+        "partial": lazy and visible is not None
+    })
+
+
+def parse_line_range(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Parse a `start-end` line range query parameter.
+    
+    Returns:
+        Tuple[int, int] or None: The range, or None if missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        start, end = value.split("-", 1)
+        return int(start), int(end)
+    except ValueError:
+        return None
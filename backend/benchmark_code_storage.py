@@ -0,0 +1,107 @@
+"""
+Benchmark plain vs compressed room code storage.
+Measures bytes written per save (write amplification) and read latency
+against the database configured by DATABASE_URL.
+
+Usage: python benchmark_code_storage.py [--lines 5000] [--updates 200] [--reads 200]
+"""
+
+import argparse
+import random
+import time
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import engine, Base, SessionLocal
+from app.db import compression
+from app.services.room_service import RoomService
+
+
+def make_document(lines: int) -> str:
+    """Generate a Python-like document."""
+    rng = random.Random(42)
+    words = ["value", "result", "items", "index", "self", "config", "data", "count"]
+    return "".join(
+        f"{'    ' * rng.randint(0, 3)}{rng.choice(words)}_{i} = {rng.choice(words)}({i})\n"
+        for i in range(lines)
+    )
+
+
+def storage_bytes(db) -> int:
+    """Bytes written by the database so far (WAL position on PostgreSQL, file size on SQLite)."""
+    if engine.dialect.name == "postgresql":
+        return db.execute(text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')")).scalar()
+    if engine.dialect.name == "sqlite":
+        page_count = db.execute(text("PRAGMA page_count")).scalar()
+        page_size = db.execute(text("PRAGMA page_size")).scalar()
+        return page_count * page_size
+    return 0
+
+
+def run(mode: str, document: str, updates: int, reads: int) -> dict:
+    """Benchmark one storage mode."""
+    settings.code_storage = mode
+    db = SessionLocal()
+    room_service = RoomService(db)
+    room_id = str(uuid4())
+    room_service.create_room(room_id)
+    rng = random.Random(7)
+    
+    try:
+        code = document
+        payload_bytes = 0
+        before = storage_bytes(db)
+        start = time.perf_counter()
+        for i in range(updates):
+            # Small edit, as typed by a user: insert a line somewhere
+            position = code.index("\n", rng.randint(0, len(code) - 2)) + 1
+            code = code[:position] + f"edit_{i} = {i}\n" + code[position:]
+            room = room_service.update_code(room_id, code)
+            payload_bytes += len(room.code_compressed) if room.code_compressed is not None else len(room.code_text.encode())
+        write_ms = (time.perf_counter() - start) * 1000 / updates
+        written = storage_bytes(db) - before
+        
+        start = time.perf_counter()
+        for _ in range(reads):
+            db.expire_all()
+            assert room_service.get_room(room_id).code == code
+        read_ms = (time.perf_counter() - start) * 1000 / reads
+        
+        return {
+            "mode": mode,
+            "payload_per_save": payload_bytes // updates,
+            "written_per_save": written // updates,
+            "write_ms": write_ms,
+            "read_ms": read_ms,
+        }
+    finally:
+        room_service.delete_room(room_id)
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+    
+    Base.metadata.create_all(bind=engine)
+    
+    document = make_document(args.lines)
+    modes = ["text", "zlib"] + (["zstd"] if compression.zstandard is not None else [])
+    
+    print(f"Document: {args.lines} lines, {len(document.encode())} bytes, {engine.dialect.name}")
+    print(f"{'mode':<6} {'payload/save':>13} {'written/save':>13} {'write ms':>9} {'read ms':>8}")
+    for mode in modes:
+        result = run(mode, document, args.updates, args.reads)
+        print(
+            f"{result['mode']:<6} {result['payload_per_save']:>13} {result['written_per_save']:>13} "
+            f"{result['write_ms']:>9.2f} {result['read_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,92 @@ Database initialization and migration helper.
 Run this to create tables if they don't exist automatically.
 """
 
-from app.db import engine, Base
-from app.models import Room
+from sqlalchemy import text, tuple_, update
+from app.config import settings
+from app.db import engine, Base, SessionLocal
+from app.db.compression import decode_code
+from app.db.migrations import add_missing_columns as add_columns
+from app.models import Room, ArchivedRoom, RoomFile
 
 def create_tables():
     """Create all tables in the database."""
     Base.metadata.create_all(bind=engine)
     print("✓ Database tables created successfully")
 
+def create_indexes():
+    """Create indexes added after a table was first created."""
+    for index in Room.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    print("✓ Database indexes created successfully")
+
+def add_missing_columns():
+    """Add columns introduced after a table was first created."""
+    for column in add_columns(engine):
+        print(f"✓ Added column {column}")
+    print("✓ Database columns up to date")
+
+def create_search_indexes():
+    """Create the pg_trgm indexes backing room search (PostgreSQL only)."""
+    if engine.dialect.name != "postgresql":
+        print("- Skipping trigram search indexes (in-process index is used outside PostgreSQL)")
+        return
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for table in ("rooms", "room_files"):
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_code_trgm ON {table} USING gin (code gin_trgm_ops)"
+            ))
+    print("✓ Trigram search indexes created successfully")
+
+def migrate_code_storage(batch_size: int = 500):
+    """
+    Rewrite room and file code in the storage mode set by CODE_STORAGE.
+    
+    Rows are converted in primary-key order, one batch per transaction,
+    without touching updated_at (which drives idle room collection).
+    """
+    db = SessionLocal()
+    try:
+        for model, keys in ((Room, (Room.room_id,)), (RoomFile, (RoomFile.room_id, RoomFile.path))):
+            if settings.code_storage == "text":
+                pending = model.code_compressed.isnot(None)
+            else:
+                pending = model.code_compressed.is_(None)
+            
+            migrated = 0
+            last_key = None
+            while True:
+                query = db.query(*keys, model.code_text, model.code_compressed).filter(pending)
+                if last_key is not None:
+                    query = query.filter(tuple_(*keys) > tuple_(*last_key))
+                rows = query.order_by(*keys).limit(batch_size).all()
+                if not rows:
+                    break
+                
+                for row in rows:
+                    key = row[:len(keys)]
+                    code = decode_code(row.code_compressed) if row.code_compressed is not None else row.code_text
+                    code_text, code_compressed = model.encode_storage(code)
+                    db.execute(
+                        update(model)
+                        .where(*(column == value for column, value in zip(keys, key)))
+                        .values({
+                            model.code_text: code_text,
+                            model.code_compressed: code_compressed,
+                            model.updated_at: model.updated_at
+                        })
+                    )
+                last_key = rows[-1][:len(keys)]
+                migrated += len(rows)
+                db.commit()
+            
+            print(f"✓ Migrated {migrated} {model.__tablename__} rows to {settings.code_storage} code storage")
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     create_tables()
+    add_missing_columns()
+    create_indexes()
+    create_search_indexes()
+    migrate_code_storage()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# Unit tests run on in-memory SQLite; importing app.db must not need a PostgreSQL driver
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    """A session on a fresh in-memory SQLite database with all tables created."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    
+    import app.models  # noqa: F401 (registers the tables)
+    from app.db import Base
+    
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
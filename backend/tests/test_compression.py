@@ -0,0 +1,38 @@
+import pytest
+
+from app.db import compression
+from app.db.compression import CODEC_RAW, CODEC_ZLIB, decode_code, encode_code
+
+DOCUMENT = "".join(f"def function_{i}(value):\n    return value * {i}  # ünïcode 🙂\n" for i in range(200))
+
+
+@pytest.mark.parametrize("codec", ["raw", "zlib", "zstd"])
+@pytest.mark.parametrize("code", ["", "x", DOCUMENT])
+def test_round_trip(codec, code):
+    assert decode_code(encode_code(code, codec)) == code
+
+
+def test_header_and_compression():
+    data = encode_code(DOCUMENT, "zlib")
+    assert data[0] == compression.FORMAT_VERSION
+    assert data[1] == CODEC_ZLIB
+    assert len(data) < len(DOCUMENT.encode("utf-8")) / 2
+
+
+def test_incompressible_code_is_stored_raw():
+    data = encode_code("ab", "zlib")
+    assert data[1] == CODEC_RAW
+    assert data[2:] == b"ab"
+
+
+def test_zstd_falls_back_to_zlib_without_zstandard(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+    data = encode_code(DOCUMENT, "zstd")
+    assert data[1] == CODEC_ZLIB
+    assert decode_code(data) == DOCUMENT
+
+
+@pytest.mark.parametrize("data", [bytes((99, CODEC_RAW)) + b"x", bytes((compression.FORMAT_VERSION, 42)) + b"x"])
+def test_unknown_version_or_codec(data):
+    with pytest.raises(ValueError):
+        decode_code(data)
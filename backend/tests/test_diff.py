@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from app.websockets.diff import apply_patch, compute_patch, patch_size
+
+
+def random_edit(rng: random.Random, code: str) -> str:
+    """Apply a few random line and character edits."""
+    lines = code.split("\n")
+    for _ in range(rng.randint(1, 5)):
+        kind = rng.choice(["insert", "delete", "change", "chars"])
+        index = rng.randrange(len(lines) + 1)
+        if kind == "insert":
+            lines.insert(index, f"line_{rng.randint(0, 99)} = {rng.random():.3f}")
+        elif kind == "delete" and lines and index < len(lines):
+            del lines[index]
+        elif kind == "change" and index < len(lines):
+            lines[index] = lines[index][::-1] + "é"
+        elif index < len(lines):
+            line = lines[index]
+            position = rng.randint(0, len(line))
+            lines[index] = line[:position] + rng.choice(["", "x", "\n", "🙂", "  "]) + line[position + 1:]
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("old, new", [
+    ("", ""),
+    ("", "hello"),
+    ("hello", ""),
+    ("same", "same"),
+    ("a\nb\nc\n", "a\nB\nc\n"),
+    ("one two three", "one 2 three"),
+    ("🙂 emoji\n", "🙂🙂 emoji\n"),
+])
+def test_round_trip_examples(old, new):
+    assert apply_patch(old, compute_patch(old, new)) == new
+
+
+def test_round_trip_random():
+    rng = random.Random(0)
+    for _ in range(2000):
+        old = "\n".join(f"value_{i} = {rng.randint(0, 9)}" for i in range(rng.randint(0, 30)))
+        new = random_edit(rng, old)
+        for max_edits in (1, 4, 64):
+            assert apply_patch(old, compute_patch(old, new, max_edits)) == new
+
+
+def test_small_edit_gives_small_patch():
+    old = "".join(f"line {i}\n" for i in range(1000))
+    new = old.replace("line 500\n", "line five hundred\n")
+    ops = compute_patch(old, new)
+    assert patch_size(ops) < 50
+
+
+def test_ops_are_sorted_and_disjoint():
+    rng = random.Random(1)
+    old = "\n".join(f"x{i}" for i in range(50))
+    for _ in range(200):
+        ops = compute_patch(old, random_edit(rng, old))
+        end = 0
+        for offset, delete, _ in ops:
+            assert offset >= end
+            end = offset + delete
+        assert end <= len(old)
@@ -0,0 +1,61 @@
+from app.websockets import rate_limiter as rate_limiter_module
+from app.websockets.rate_limiter import DEFAULT_ACTION, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_burst_then_refill(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter_module.time, "monotonic", clock)
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    
+    assert [bucket.consume() for _ in range(4)] == [True, True, True, False]
+    clock.now += 0.5
+    assert bucket.consume()
+    assert not bucket.consume()
+    
+    # Refill never exceeds capacity
+    clock.now += 100
+    assert [bucket.consume() for _ in range(4)] == [True, True, True, False]
+
+
+def make_limiter() -> RateLimiter:
+    return RateLimiter(
+        connection_limits={"update": (0.0, 2), DEFAULT_ACTION: (0.0, 1)},
+        room_limits={"update": (0.0, 3), DEFAULT_ACTION: (0.0, 10)},
+    )
+
+
+def test_connection_then_room_budget():
+    limiter = make_limiter()
+    assert limiter.allow("room", "a", "update")
+    assert limiter.allow("room", "a", "update")
+    assert not limiter.allow("room", "a", "update")
+    # Another user still has a connection budget, but only one room token is left
+    assert limiter.allow("room", "b", "update")
+    assert not limiter.allow("room", "b", "update")
+    assert limiter.get_stats()["throttled"] == {"update": 2}
+
+
+def test_unknown_actions_share_the_default_bucket_and_counter():
+    limiter = make_limiter()
+    for i in range(100):
+        limiter.allow("room", "a", f"random-{i}")
+    
+    assert set(limiter.connection_buckets[("room", "a")]) == {DEFAULT_ACTION}
+    assert limiter.get_stats()["throttled"] == {DEFAULT_ACTION: 99}
+
+
+def test_forget_connection_and_room():
+    limiter = make_limiter()
+    limiter.allow("room", "a", "update")
+    limiter.forget_connection("room", "a")
+    limiter.forget_room("room")
+    assert limiter.connection_buckets == {}
+    assert limiter.room_buckets == {}
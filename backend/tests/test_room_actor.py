@@ -0,0 +1,213 @@
+import asyncio
+from typing import List, Optional
+
+from app.websockets.diff import apply_patch
+from app.websockets.room_actor import MAIN_FILE, RoomActor
+
+
+class FakeManager:
+    """Records what the actor sends instead of writing to sockets."""
+    
+    def __init__(self, patch_clients: bool = False):
+        self.patch_clients = patch_clients
+        self.subscriptions = {}
+        self.frames: List[tuple] = []
+        self.spectator_frames: List[dict] = []
+    
+    def has_patch_clients(self, room_id: str, file: Optional[str] = MAIN_FILE) -> bool:
+        return self.patch_clients
+    
+    def has_subscribers(self, room_id: str, file: Optional[str]) -> bool:
+        return any(file in files for files in self.subscriptions.values())
+    
+    def subscribe(self, room_id: str, user_id: str, file: Optional[str]) -> None:
+        self.subscriptions.setdefault(user_id, set()).add(file)
+    
+    def unsubscribe(self, room_id: str, user_id: str, file: Optional[str]) -> None:
+        self.subscriptions.get(user_id, set()).discard(file)
+    
+    async def broadcast_file(self, room_id, file, message, patch_message=None) -> None:
+        self.frames.append((file, message, patch_message))
+    
+    async def close_file(self, room_id: str, file: Optional[str], message: dict) -> None:
+        for files in self.subscriptions.values():
+            files.discard(file)
+        self.frames.append((file, message, None))
+    
+    def publish_to_spectators(self, room_id: str, message: dict) -> None:
+        self.spectator_frames.append(message)
+    
+    def messages(self, frame_type: str) -> List[dict]:
+        return [message for _, message, _ in self.frames if message["type"] == frame_type]
+
+
+def make_actor(manager: FakeManager, code: str = "", saved: Optional[list] = None) -> RoomActor:
+    actor = RoomActor("room", code, manager, tick_interval=0.01)
+    
+    # Record saves instead of writing to the database
+    def persist(path, code):
+        if saved is not None:
+            saved.append((path, code))
+        return True
+    
+    actor._persist = persist
+    return actor
+
+
+def update(code: str, user_id: str = "u1", file: Optional[str] = MAIN_FILE) -> dict:
+    message = {"action": "update", "user_id": user_id, "color": "#000", "code": code}
+    if file is not MAIN_FILE:
+        message["file"] = file
+    return message
+
+
+def cursor(position: int, user_id: str = "u1") -> dict:
+    return {"action": "cursor_position", "user_id": user_id, "color": "#000", "position": position, "line": 1}
+
+
+async def wait_for(predicate, timeout: float = 2.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def test_one_tick_coalesces_edits_and_cursors():
+    async def scenario():
+        manager = FakeManager()
+        saved = []
+        actor = make_actor(manager, "", saved)
+        for message in (update("a"), cursor(1), update("ab"), cursor(2), update("abc", "u2")):
+            actor.post(message)
+        actor.stop()
+        await actor.wait_stopped()
+        return manager, actor, saved
+    
+    manager, actor, saved = asyncio.run(scenario())
+    
+    [code_update] = manager.messages("code_update")
+    assert code_update["code"] == "abc"
+    assert code_update["user_id"] == "u2"
+    assert code_update["edits"] == 3
+    [cursor_update] = manager.messages("cursor_update")
+    assert cursor_update["position"] == 2
+    assert saved == [(MAIN_FILE, "abc")]
+    assert actor.code == "abc"
+    assert (actor.messages_in, actor.frames_out) == (5, 2)
+    assert manager.spectator_frames == [code_update, cursor_update]
+
+
+def test_revision_is_bumped_once_per_tick_and_patches_chain():
+    async def scenario():
+        manager = FakeManager(patch_clients=True)
+        actor = make_actor(manager, "hello world\n" * 20)
+        edits = ("hello world\n" * 19 + "hello there\n", "hello world\n" * 19 + "bye\n")
+        for count, code in enumerate(edits, 1):
+            actor.post(update(code))
+            await wait_for(lambda: len(manager.frames) == count)
+        actor.stop()
+        await actor.wait_stopped()
+        return manager, actor
+    
+    manager, actor = asyncio.run(scenario())
+    
+    assert actor.revision() == 2
+    document, revision = "hello world\n" * 20, 0
+    for _, code_update, patch in manager.frames:
+        assert code_update["rev"] == revision + 1
+        assert patch["base_rev"] == revision
+        document, revision = apply_patch(document, patch["ops"]), patch["rev"]
+    assert document == actor.code
+
+
+def test_actor_continues_from_a_given_revision():
+    async def scenario():
+        manager = FakeManager()
+        actor = RoomActor("room", "x", manager, tick_interval=0.01, revision=41)
+        actor._persist = lambda *args: True
+        actor.post(update("y"))
+        actor.stop()
+        await actor.wait_stopped()
+        return manager
+    
+    [code_update] = asyncio.run(scenario()).messages("code_update")
+    assert code_update["rev"] == 42
+
+
+def test_file_edits_go_to_file_subscribers_only():
+    async def scenario():
+        manager = FakeManager()
+        saved = []
+        actor = make_actor(manager, "main", saved)
+        actor._load = lambda path: "print(1)" if path == "a.py" else None
+        
+        assert await actor.open_file("a.py", "u1") == "print(1)"
+        assert await actor.open_file("missing.py", "u1") is None
+        actor.post(update("print(2)", file="a.py"))
+        actor.post(update("not opened", file="b.py"))
+        actor.post(dict(cursor(3), file="a.py"))
+        actor.stop()
+        await actor.wait_stopped()
+        return manager, actor, saved
+    
+    manager, actor, saved = asyncio.run(scenario())
+    
+    assert manager.subscriptions == {"u1": {"a.py"}}
+    assert [(file, message["type"]) for file, message, _ in manager.frames] == [
+        ("a.py", "code_update"),
+        ("a.py", "cursor_update"),
+    ]
+    assert all(message["file"] == "a.py" for _, message, _ in manager.frames)
+    assert manager.spectator_frames == []
+    assert saved == [("a.py", "print(2)")]
+    assert actor.documents == {MAIN_FILE: "main", "a.py": "print(2)"}
+    assert actor.revision("a.py") == 1
+    assert actor.revision() == 0
+
+
+def test_files_without_subscribers_are_closed():
+    async def scenario():
+        manager = FakeManager()
+        actor = make_actor(manager)
+        actor._load = lambda path: ""
+        await actor.open_file("a.py", "u1")
+        await actor.open_file("b.py", "u1")
+        manager.unsubscribe("room", "u1", "a.py")
+        actor.post(update("x", file="b.py"))
+        actor.stop()
+        await actor.wait_stopped()
+        return actor
+    
+    assert set(asyncio.run(scenario()).documents) == {MAIN_FILE, "b.py"}
+
+
+def test_deleted_files_are_closed_for_their_subscribers():
+    async def scenario():
+        manager = FakeManager()
+        actor = make_actor(manager)
+        actor._load = lambda path: ""
+        await actor.open_file("a.py", "u1")
+        await actor.open_file("b.py", "u1")
+        
+        # Deleted through the API on this worker: pending edits are dropped
+        actor.post(update("lost", file="a.py"))
+        actor.close_file("a.py")
+        await wait_for(lambda: "a.py" not in actor.documents)
+        
+        # Deleted on another worker: the save finds no row
+        actor._persist = lambda path, code: False
+        actor.post(update("lost too", file="b.py"))
+        actor.stop()
+        await actor.wait_stopped()
+        return manager, actor
+    
+    manager, actor = asyncio.run(scenario())
+    
+    assert manager.messages("code_update") == []
+    assert manager.messages("file_deleted") == [
+        {"type": "file_deleted", "file": "a.py"},
+        {"type": "file_deleted", "file": "b.py"},
+    ]
+    assert manager.subscriptions == {"u1": set()}
+    assert set(actor.documents) == {MAIN_FILE}
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.models import ArchivedRoom, Room
+from app.services.room_service import RoomService
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+CUTOFF = NOW - timedelta(days=30)
+
+
+def add_room(db, room_id: str, age_days: float, active_users: int = 0) -> None:
+    updated_at = NOW - timedelta(days=age_days)
+    db.add(Room(
+        room_id=room_id,
+        code=f"# {room_id}",
+        created_at=updated_at,
+        updated_at=updated_at,
+        active_users=active_users
+    ))
+    db.commit()
+
+
+def room_ids(db, model=Room) -> set:
+    return {room_id for (room_id,) in db.query(model.room_id).all()}
+
+
+def test_purge_removes_only_idle_rooms_without_users(db):
+    add_room(db, "idle", 40)
+    add_room(db, "recent", 1)
+    add_room(db, "stuck", 40, active_users=2)
+    add_room(db, "live", 40)
+    
+    removed = RoomService(db).purge_idle_rooms(CUTOFF, batch_size=10, exclude=["live"])
+    assert removed == 1
+    assert room_ids(db) == {"recent", "stuck", "live"}
+    assert room_ids(db, ArchivedRoom) == set()
+
+
+def test_purge_works_in_batches_oldest_first(db):
+    for i in range(5):
+        add_room(db, f"idle-{i}", 40 + i)
+    service = RoomService(db)
+    
+    assert service.purge_idle_rooms(CUTOFF, batch_size=2) == 2
+    assert room_ids(db) == {"idle-0", "idle-1", "idle-2"}
+    assert service.purge_idle_rooms(CUTOFF, batch_size=2) == 2
+    assert service.purge_idle_rooms(CUTOFF, batch_size=2) == 1
+    assert service.purge_idle_rooms(CUTOFF, batch_size=2) == 0
+
+
+def test_purge_can_archive(db):
+    add_room(db, "idle", 40)
+    
+    assert RoomService(db).purge_idle_rooms(CUTOFF, batch_size=10, archive=True) == 1
+    assert room_ids(db) == set()
+    archived = db.get(ArchivedRoom, "idle")
+    assert archived.code == "# idle"
+    assert archived.updated_at == NOW - timedelta(days=40)
+
+
+def test_active_users_counts_are_not_lost_across_sessions(db):
+    add_room(db, "room", 1)
+    other = Session(bind=db.get_bind())
+    first, second = RoomService(db), RoomService(other)
+    
+    # Each connection has its own session holding the room row
+    first.increment_active_users("room")
+    second.increment_active_users("room")
+    first.decrement_active_users("room")
+    assert second.decrement_active_users("room").active_users == 0
+    assert first.decrement_active_users("room").active_users == 0
+    other.close()
+
+
+def test_reset_active_users_keeps_recent_rooms_and_updated_at(db):
+    add_room(db, "stale", 40, active_users=3)
+    add_room(db, "recent", 1, active_users=2)
+    
+    assert RoomService(db).reset_active_users(CUTOFF) == 1
+    db.expire_all()
+    assert db.get(Room, "stale").active_users == 0
+    assert db.get(Room, "stale").updated_at == NOW - timedelta(days=40)
+    assert db.get(Room, "recent").active_users == 2
+
+
+def test_list_rooms_pages_by_updated_at_then_room_id(db):
+    # Two rooms share each timestamp, so pages must break ties on room_id
+    for i in range(7):
+        add_room(db, f"room-{i}", 10 - i // 2)
+    service = RoomService(db)
+    
+    pages = []
+    after = None
+    while True:
+        page = service.list_rooms(3, after)
+        if not page:
+            break
+        pages.append([room.room_id for room in page])
+        after = (page[-1].updated_at, page[-1].room_id)
+    
+    assert pages == [
+        ["room-0", "room-1", "room-2"],
+        ["room-3", "room-4", "room-5"],
+        ["room-6"],
+    ]
@@ -0,0 +1,98 @@
+from app.services.search_index import TrigramIndex, find_snippets, trigrams
+
+ROOMS = {
+    ("r1", None): "import re\n\ndef parse_tokens(text):\n    return text.split()\n",
+    ("r2", None): "class Parser:\n    pass\n",
+    ("r2", "util.py"): "PARSER = Parser()\nparser_cache = {}\n",
+    ("r3", None): "print('hello')\n",
+}
+
+
+def make_index() -> TrigramIndex:
+    index = TrigramIndex()
+    index.ensure_loaded(lambda: ROOMS.items())
+    return index
+
+
+def keys(results):
+    return {key for key, _ in results}
+
+
+def test_trigrams():
+    assert trigrams("AbCd") == {"abc", "bcd"}
+    assert trigrams("ab") == set()
+
+
+def test_find_snippets():
+    snippets = find_snippets(ROOMS[("r2", "util.py")], "parser")
+    assert snippets == [
+        {"line": 1, "text": "PARSER = Parser()"},
+        {"line": 2, "text": "parser_cache = {}"},
+    ]
+    assert find_snippets("a\n" * 10 + "needle", "NEEDLE") == [{"line": 11, "text": "needle"}]
+    assert len(find_snippets("xyz\n" * 10, "xyz", limit=3)) == 3
+
+
+def test_search_is_case_insensitive_substring():
+    index = make_index()
+    assert keys(index.search("parse", 10)) == {("r1", None), ("r2", None), ("r2", "util.py")}
+    assert keys(index.search("PARSE_TOK", 10)) == {("r1", None)}
+    assert index.search("nowhere", 10) == []
+
+
+def test_trigram_candidates_are_verified():
+    index = TrigramIndex()
+    index.ensure_loaded(lambda: [(("r", None), "abcd bcde")])
+    # Every trigram of "abcde" is present, but not the substring
+    assert index.search("abcde", 10) == []
+
+
+def test_updates_and_removals_apply_incrementally():
+    index = make_index()
+    index.search("parse", 10)
+    
+    index.update("r3", None, "from parser import parse\n")
+    index.remove("r2", "util.py")
+    index.remove_room("r1")
+    assert keys(index.search("parse", 10)) == {("r2", None), ("r3", None)}
+    
+    # Trigrams of removed text are dropped from the postings
+    assert all(("r1", None) not in keys for keys in index.postings.values())
+    assert "tok" not in index.postings
+
+
+def test_updates_before_loading_are_ignored_and_saves_win_over_loaded_rows():
+    index = TrigramIndex()
+    index.update("r1", None, "ignored")
+    
+    def load():
+        # A save racing with the build takes precedence over the stale row
+        index.update("r1", None, "fresh text")
+        yield ("r1", None), "stale text"
+    
+    index.ensure_loaded(load)
+    assert keys(index.search("fresh", 10)) == {("r1", None)}
+    assert index.search("stale", 10) == []
+    assert index.search("ignored", 10) == []
+
+
+def test_results_are_ordered_by_room_then_path():
+    index = make_index()
+    results = index.search("parse", 10)
+    assert [key for key, _ in results] == [("r1", None), ("r2", None), ("r2", "util.py")]
+
+
+def test_verification_stops_at_the_limit(monkeypatch):
+    import app.services.search_index as search_index_module
+    
+    verified = []
+    
+    def counting_find_snippets(code, query):
+        verified.append(code)
+        return find_snippets(code, query)
+    
+    index = TrigramIndex()
+    index.ensure_loaded(lambda: [((f"room{i:03d}", None), "foo\n") for i in range(100)])
+    monkeypatch.setattr(search_index_module, "find_snippets", counting_find_snippets)
+    assert [key for key, _ in index.search("foo", 2)] == [("room000", None), ("room001", None)]
+    assert len(verified) == 2
@@ -0,0 +1,119 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from app.config import settings
+from app.websockets.connection_manager import ConnectionManager
+
+ROOM = "room"
+
+
+class FakeWebSocket:
+    def __init__(self, hang: bool = False):
+        self.hang = hang
+        self.sent: List[dict] = []
+        self.closed = False
+    
+    async def accept(self) -> None:
+        pass
+    
+    async def send_json(self, message: dict) -> None:
+        if self.hang:
+            await asyncio.sleep(3600)
+        self.sent.append(message)
+    
+    async def close(self, code: int = 1000) -> None:
+        self.closed = True
+    
+    def types(self) -> List[str]:
+        return [message["type"] for message in self.sent]
+
+
+@pytest.fixture(autouse=True)
+def fast_fanout(monkeypatch):
+    monkeypatch.setattr(settings, "ws_spectator_interval", 0.01)
+    monkeypatch.setattr(settings, "ws_spectator_send_timeout", 0.05)
+
+
+def code_update(code: str) -> dict:
+    return {"type": "code_update", "code": code, "user_id": "u1", "color": "#000", "edits": 1}
+
+
+async def wait_for(predicate, timeout: float = 2.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def test_batches_keep_only_the_latest_code_and_cursors():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect_spectator(ROOM, websocket)
+        await wait_for(lambda: websocket.sent)
+        
+        for code in ("a", "ab", "abc"):
+            manager.publish_to_spectators(ROOM, code_update(code))
+        for position in (1, 2):
+            manager.publish_to_spectators(ROOM, {"type": "cursor_update", "user_id": "u1", "position": position})
+        await wait_for(lambda: len(websocket.sent) == 3)
+        await asyncio.sleep(0.05)
+        return manager, websocket
+    
+    manager, websocket = asyncio.run(scenario())
+    
+    assert websocket.types() == ["presence", "code_update", "cursor_update"]
+    assert websocket.sent[1]["code"] == "abc"
+    assert websocket.sent[2]["position"] == 2
+    assert manager.get_spectator_frames() == 3
+
+
+def test_slow_spectators_are_dropped_without_holding_back_the_others():
+    async def scenario():
+        manager = ConnectionManager()
+        fast, slow = FakeWebSocket(), FakeWebSocket(hang=True)
+        fast_id = await manager.connect_spectator(ROOM, fast)
+        await manager.connect_spectator(ROOM, slow)
+        
+        manager.publish_to_spectators(ROOM, code_update("x"))
+        await wait_for(lambda: manager.get_spectator_count(ROOM) == 1)
+        fanout = manager.spectator_fanouts[ROOM]
+        
+        # The fan-out keeps serving the remaining spectator
+        manager.publish_to_spectators(ROOM, code_update("y"))
+        await wait_for(lambda: code_update("y") in fast.sent)
+        frames = manager.get_spectator_frames()
+        
+        # Counters survive the fan-out stopping with the last spectator
+        await manager.disconnect(ROOM, fast_id)
+        await asyncio.sleep(0)
+        return manager, fast, slow, fanout, frames
+    
+    manager, fast, slow, fanout, frames = asyncio.run(scenario())
+    
+    assert slow.closed and not fast.closed
+    assert slow.sent == []
+    assert "code_update" in fast.types()
+    assert fanout._task.cancelled()
+    assert manager.spectator_fanouts == {}
+    assert manager.get_spectator_frames() == frames
+
+
+def test_dropping_the_last_spectator_stops_the_fanout_from_within():
+    async def scenario():
+        manager = ConnectionManager()
+        slow = FakeWebSocket(hang=True)
+        await manager.connect_spectator(ROOM, slow)
+        fanout = manager.spectator_fanouts[ROOM]
+        await wait_for(lambda: fanout._task.done())
+        return manager, slow, fanout
+    
+    manager, slow, fanout = asyncio.run(scenario())
+    
+    assert slow.closed
+    assert manager.spectators == {} and manager.spectator_fanouts == {}
+    # Exited after its batch instead of cancelling itself mid-disconnect
+    assert not fanout._task.cancelled()
@@ -0,0 +1,44 @@
+import pytest
+
+from app.websockets.sync import iter_chunks, line_range_to_offsets, parse_line_range
+
+CODE = "one\ntwo\nthree\n"
+
+
+@pytest.mark.parametrize("start_line, end_line, expected", [
+    (1, 1, "one\n"),
+    (2, 3, "two\nthree\n"),
+    (1, 99, CODE),
+    (3, 2, "three\n"),
+    (0, 1, "one\n"),
+    (4, 5, ""),
+    (10, 12, ""),
+])
+def test_line_range_to_offsets(start_line, end_line, expected):
+    start, end = line_range_to_offsets(CODE, start_line, end_line)
+    assert CODE[start:end] == expected
+
+
+def test_line_range_without_trailing_newline():
+    code = "a\nb"
+    start, end = line_range_to_offsets(code, 2, 2)
+    assert code[start:end] == "b"
+
+
+def test_iter_chunks_cover_the_range():
+    code = "x" * 10 + "y" * 7
+    chunks = list(iter_chunks(code, 4, 3, 15))
+    assert [offset for offset, _ in chunks] == [3, 7, 11]
+    assert "".join(data for _, data in chunks) == code[3:15]
+    assert all(len(data) <= 4 for _, data in chunks)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("3-10", (3, 10)),
+    (None, None),
+    ("", None),
+    ("abc", None),
+    ("1-x", None),
+])
+def test_parse_line_range(value, expected):
+    assert parse_line_range(value) == expected